@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""Benchmark check_js_supply_chain.py against reproducible synthetic workspaces."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import check_js_supply_chain as scanner  # noqa: E402
+from fixtures_js_supply_chain import write_json, write_stub_pnpm  # noqa: E402
+
+RESULTS_VERSION = 1
+STUB_PNPM_CONFIG = {
+    "minimumReleaseAge": 10080,
+    "minimumReleaseAgeStrict": True,
+    "minimumReleaseAgeIgnoreMissingTime": False,
+    "blockExoticSubdeps": True,
+    "trustPolicy": "no-downgrade",
+    "trustPolicyIgnoreAfter": 43200,
+    "dangerouslyAllowAllBuilds": False,
+}
+WORKSPACE_POLICY = """minimumReleaseAge: 10080
+minimumReleaseAgeStrict: true
+minimumReleaseAgeIgnoreMissingTime: false
+blockExoticSubdeps: true
+trustPolicy: no-downgrade
+trustPolicyIgnoreAfter: 43200
+dangerouslyAllowAllBuilds: false
+savePrefix: ""
+allowBuilds: {}
+"""
+WORKFLOW = """name: ci-{index}
+on:
+  {trigger}:
+jobs:
+  build:
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v4
+      - uses: actions/cache@v4
+      - run: pnpm install --frozen-lockfile
+      - run: pnpm test
+"""
+
+
+def lib_name(index: int) -> str:
+    return f"@bench/lib-{index}"
+
+
+def lib_version(index: int) -> str:
+    return f"1.{index % 10}.{index % 7}"
+
+
+def generate_workspace(base: Path, config: dict[str, int]) -> tuple[Path, Path, Path]:
+    rng = random.Random(config["seed"])
+    workspace = base / "workspace"
+    bin_dir = base / "bin"
+    write_json(
+        workspace / "package.json",
+        {"name": "bench", "private": True, "packageManager": "pnpm@11.1.1", "devDependencies": {"typescript": "5.4.5"}},
+    )
+    (workspace / "pnpm-workspace.yaml").write_text(WORKSPACE_POLICY)
+
+    for index in range(config["packages"]):
+        package_dir = workspace / "packages" / f"pkg-{index}"
+        dependencies = {lib_name(dep): lib_version(dep) for dep in rng.sample(range(config["lock_entries"] or 1), 3)}
+        if index % 5 == 0:
+            dependencies["left-pad"] = "^1.3.0"
+        manifest: dict[str, Any] = {"name": f"pkg-{index}", "version": "0.0.0", "dependencies": dependencies}
+        if index % 9 == 0:
+            manifest["scripts"] = {"postinstall": "node scripts/setup.js"}
+        write_json(package_dir / "package.json", manifest)
+        source_dir = package_dir / "src"
+        source_dir.mkdir(parents=True, exist_ok=True)
+        for file_index in range(config["files_per_package"]):
+            (source_dir / f"module-{file_index}.ts").write_text(f"export const value{file_index} = {file_index};\n")
+
+    workflows = workspace / ".github" / "workflows"
+    workflows.mkdir(parents=True, exist_ok=True)
+    for index in range(config["workflows"]):
+        trigger = "pull_request_target" if index % 10 == 0 else "pull_request"
+        (workflows / f"ci-{index}.yml").write_text(WORKFLOW.format(index=index, trigger=trigger))
+
+    with (workspace / "pnpm-lock.yaml").open("w") as handle:
+        handle.write("lockfileVersion: '9.0'\n\npackages:\n\n")
+        for index in range(config["lock_entries"]):
+            handle.write(f"  '{lib_name(index)}@{lib_version(index)}':\n")
+            handle.write(f"    resolution: {{integrity: sha512-{rng.getrandbits(256):064x}}}\n\n")
+        handle.write("snapshots:\n\n")
+        for index in range(config["lock_entries"]):
+            handle.write(f"  '{lib_name(index)}@{lib_version(index)}': {{}}\n\n")
+
+    store = workspace / "node_modules" / ".pnpm"
+    for index in range(config["installed"]):
+        name = lib_name(index)
+        entry = store / f"{name.replace('/', '+')}@{lib_version(index)}" / "node_modules" / name
+        manifest = {"name": name, "version": lib_version(index)}
+        if index % 13 == 0:
+            manifest["scripts"] = {"install": "node-gyp rebuild"}
+        write_json(entry / "package.json", manifest)
+
+    # Half of the known-bad versions are really locked so IOC hits scale with the profile.
+    package_versions: dict[str, list[str]] = {}
+    for index in range(config["iocs"]):
+        if index % 2 == 0 and index < config["lock_entries"]:
+            package_versions[lib_name(index)] = [lib_version(index)]
+        else:
+            package_versions[f"@bench-ioc/pkg-{index}"] = ["9.9.9"]
+    profile = base / "bench-ioc.json"
+    write_json(
+        profile,
+        {
+            "name": "bench-ioc",
+            "fingerprints": [f"bench-fingerprint-{index}" for index in range(max(1, config["iocs"] // 10))],
+            "payload_file_names": ["bench_payload.js"],
+            "persistence_paths": [".claude/bench_payload.js"],
+            "workflow_patterns": ["toJSON(secrets)"],
+            "package_versions": package_versions,
+        },
+    )
+
+    write_stub_pnpm(bin_dir, STUB_PNPM_CONFIG)
+    return workspace, profile, bin_dir
+
+
+def reset_peak_rss() -> bool:
+    # Linux lets a process reset its own high-water mark, giving per-phase peaks.
+    try:
+        with open("/proc/self/clear_refs", "w") as handle:
+            handle.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_kb() -> int:
+    try:
+        with open("/proc/self/status") as handle:
+            for line in handle:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def measure(action: Callable[[], Any]) -> tuple[Any, dict[str, float]]:
+    per_phase = reset_peak_rss()
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    result = action()
+    return result, {
+        "wall_s": round(time.perf_counter() - started, 6),
+        "cpu_s": round(time.process_time() - cpu_started, 6),
+        "peak_rss_kb": peak_rss_kb(),
+        "peak_rss_scope": "phase" if per_phase else "process",
+    }
+
+
+def run_phases(workspace: Path, profile_path: Path) -> dict[str, Any]:
+    profiles = scanner.load_ioc_profiles([str(profile_path)])
+    phases: dict[str, dict[str, Any]] = {}
+
+    matcher, phases["compile_iocs"] = measure(lambda: scanner.compile_ioc_profiles(profiles))
+    entries, phases["walk"] = measure(lambda: list(scanner.walk_files(workspace)))
+
+    def analyze() -> int:
+        count = 0
+        for entry in entries:
+            name = entry.name
+            if name in scanner.PACKAGE_MANAGER_FILES or name in scanner.CONFIG_FILES or entry.suffix in scanner.CI_FILES:
+                text = None if scanner.is_streamed(entry) else scanner.read_text(entry.path)
+                scanner.analyze_file(workspace, matcher, entry, text)
+            else:
+                scanner.scan_iocs(matcher, entry.relative, "")
+            count += 1
+        return count
+
+    _, phases["analyze_files"] = measure(analyze)
+
+    context = scanner.ScanContext(workspace)
+
+    def policy() -> int:
+        scanner.repo_config_findings(context)
+        scanner.effective_config_findings(context)
+        return context.subprocess_count
+
+    subprocesses, phases["policy"] = measure(policy)
+    phases["policy"]["subprocesses"] = subprocesses
+    installed, phases["installed"] = measure(lambda: list(scanner.installed_package_findings(workspace)))
+    report, phases["full_scan"] = measure(lambda: scanner.scan(workspace, None, profiles, True, matcher=matcher))
+    phases["full_scan"]["subprocesses"] = report["subprocess_count"]
+    return {
+        "phases": phases,
+        "totals": {
+            "files": len(entries),
+            "installed_lifecycle_scripts": len(installed),
+            "ioc_hits": len(report["ioc_hits"]),
+            "risky_direct_specs": len(report["risky_direct_specs"]),
+            "ci_install_findings": len(report["ci_install_findings"]),
+        },
+    }
+
+
+def best_of(runs: list[dict[str, Any]]) -> dict[str, Any]:
+    best = runs[0]
+    for phase in best["phases"]:
+        for key in ("wall_s", "cpu_s", "peak_rss_kb"):
+            best["phases"][phase][key] = min(run["phases"][phase][key] for run in runs)
+    return best
+
+
+def compare(
+    results: dict[str, Any], baseline: dict[str, Any], threshold: float, min_delta: dict[str, float]
+) -> list[str]:
+    # A regression must clear both the relative threshold and an absolute floor, so millisecond phases that
+    # double from scheduler noise do not fail the comparison.
+    regressions: list[str] = []
+    for phase, current in results["phases"].items():
+        previous = baseline.get("phases", {}).get(phase)
+        if not isinstance(previous, dict):
+            continue
+        for key in ("wall_s", "peak_rss_kb"):
+            before, after = previous.get(key), current.get(key)
+            if not isinstance(before, (int, float)) or before <= 0 or after - before < min_delta[key]:
+                continue
+            if after > before * (1 + threshold):
+                regressions.append(f"{phase}.{key}: {before} -> {after} (+{(after / before - 1) * 100:.0f}%)")
+        if current.get("subprocesses", 0) > previous.get("subprocesses", current.get("subprocesses", 0)):
+            regressions.append(f"{phase}.subprocesses: {previous['subprocesses']} -> {current['subprocesses']}")
+    if results.get("config") != baseline.get("config"):
+        regressions.append("workspace config differs from baseline; comparison is not like-for-like")
+    return regressions
+
+
+def print_results(results: dict[str, Any]) -> None:
+    for phase, values in results["phases"].items():
+        extra = f", {values['subprocesses']} subprocesses" if "subprocesses" in values else ""
+        print(f"{phase:14} {values['wall_s']:9.4f}s wall {values['cpu_s']:9.4f}s cpu {values['peak_rss_kb']:8d} KB{extra}")
+    print(f"totals: {json.dumps(results['totals'], sort_keys=True)}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--packages", type=int, default=200, help="Workspace packages to generate")
+    parser.add_argument("--files-per-package", type=int, default=20, help="Source files per package")
+    parser.add_argument("--workflows", type=int, default=50, help="GitHub workflow files to generate")
+    parser.add_argument("--lock-entries", type=int, default=5000, help="pnpm-lock.yaml package entries")
+    parser.add_argument("--installed", type=int, default=1000, help="Installed .pnpm packages")
+    parser.add_argument("--iocs", type=int, default=200, help="IOC package versions in the synthetic profile")
+    parser.add_argument("--seed", type=int, default=1, help="Generator seed")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per phase; the best run is recorded")
+    parser.add_argument("--workspace", help="Generate into this directory and keep it (default: temporary)")
+    parser.add_argument("--output", default="bench-results.json", help="Results JSON path")
+    parser.add_argument("--baseline", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression (0.2 = 20%%)")
+    parser.add_argument(
+        "--min-wall-delta", type=float, default=0.05, help="Wall-time growth in seconds below which no phase regresses"
+    )
+    parser.add_argument(
+        "--min-rss-delta-kb", type=int, default=4096, help="Peak RSS growth in KB below which no phase regresses"
+    )
+    args = parser.parse_args()
+
+    config = {
+        "packages": args.packages,
+        "files_per_package": args.files_per_package,
+        "workflows": args.workflows,
+        "lock_entries": args.lock_entries,
+        "installed": args.installed,
+        "iocs": args.iocs,
+        "seed": args.seed,
+    }
+    base = Path(args.workspace).expanduser().resolve() if args.workspace else Path(tempfile.mkdtemp(prefix="pscbench-"))
+    try:
+        workspace, profile, bin_dir = generate_workspace(base, config)
+        os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+        runs = [run_phases(workspace, profile) for _ in range(max(1, args.repeat))]
+    finally:
+        if not args.workspace:
+            shutil.rmtree(base, ignore_errors=True)
+
+    results = {
+        "version": RESULTS_VERSION,
+        "config": config,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        **best_of(runs),
+    }
+    Path(args.output).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+    print_results(results)
+    print(f"wrote {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        min_delta = {"wall_s": args.min_wall_delta, "peak_rss_kb": args.min_rss_delta_kb}
+        regressions = compare(results, baseline, args.threshold, min_delta)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
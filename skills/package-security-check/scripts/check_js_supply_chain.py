@@ -4,14 +4,39 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import base64
+import ctypes
+import ctypes.util
+import hashlib
+import heapq
 import json
+import mmap
+import multiprocessing
 import os
 import re
+import select
+import signal
+import socket
+import socketserver
+import sqlite3
+import struct
 import subprocess
 import sys
-from datetime import datetime, timezone
+import tarfile
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import AbstractContextManager, contextmanager, nullcontext, suppress
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from itertools import islice
 from pathlib import Path
-from typing import Any
+from stat import S_ISREG
+from typing import IO, Any, Callable, Iterable, Iterator
 
 PACKAGE_MANAGER_FILES = {
     "package.json",
@@ -24,6 +49,9 @@ PACKAGE_MANAGER_FILES = {
 }
 CONFIG_FILES = {"pnpm-workspace.yaml", ".npmrc", ".yarnrc.yml", "bunfig.toml"}
 CI_FILES = {".yml", ".yaml"}
+LOCKFILES = PACKAGE_MANAGER_FILES - {"package.json"}
+STREAM_THRESHOLD_BYTES = 16 * 1024 * 1024
+MMAP_WINDOW_BYTES = 8 * 1024 * 1024
 LIFECYCLE_SCRIPTS = {"preinstall", "install", "postinstall", "prepare", "prepublish", "prepublishOnly"}
 PNPM_POLICY_KEYS = {
     "minimumReleaseAge": ("minimumReleaseAge", "minimum-release-age"),
@@ -38,6 +66,63 @@ PNPM_POLICY_KEYS = {
     "dangerouslyAllowAllBuilds": ("dangerouslyAllowAllBuilds", "dangerously-allow-all-builds"),
     "savePrefix": ("savePrefix", "save-prefix"),
 }
+REPORT_FINDING_KEYS = (
+    "ioc_hits",
+    "integrity_mismatches",
+    "risky_direct_specs",
+    "package_lifecycle_scripts",
+    "installed_lifecycle_scripts",
+    "ci_install_findings",
+    "recent_package_manager_files",
+    "release_age_findings",
+    "repo_config_findings",
+    "effective_config_findings",
+)
+# Sections that prove tampering: they stop a --fail-fast scan and set exit code 1 without --strict.
+FAIL_FAST_SECTIONS = ("ioc_hits", "integrity_mismatches")
+FILE_RESULT_KEYS = ("ioc_hits", "risky_direct_specs", "package_lifecycle_scripts", "ci_install_findings")
+CACHE_VERSION = 5
+IOC_INDEX_FORMAT = "package-security-check/ioc-index"
+IOC_INDEX_VERSION = 1
+DEFAULT_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "package-security-check"
+INSTALLED_POOL_MIN_FILES = 2000
+# Pool workers must not be forked from a process that already runs fleet, walker or --watch server threads.
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+# Each shared IOC match can hold a full resolved lockfile index; a long-lived Scanner or --watch daemon keeps only
+# the most recently used ones.
+SHARED_MATCHES_LIMIT = 128
+FINDINGS_MEMORY_BUDGET = 64 * 1024 * 1024
+SPILL_READ_BYTES = 1024 * 1024
+INSTRUMENTATION_COUNTERS = (
+    "files_visited",
+    "files_analyzed",
+    "bytes_read",
+    "json_parses",
+    "shared_file_hits",
+    "lockfile_parses",
+    "regex_evaluations",
+    "files_hashed",
+    "subprocesses",
+    "subprocess_seconds",
+)
+SUBPROCESS_TIMEOUT_SECONDS = 8
+PROBE_BUDGET_SECONDS = 20.0
+# Reported for a policy probe that did not answer before the --probe-budget deadline or its own timeout.
+PROBE_UNKNOWN = "unknown"
+PROBE_BUDGET_LIMIT = "--probe-budget"
+COMMAND_LIMIT = f"the {SUBPROCESS_TIMEOUT_SECONDS}s per-command timeout"
+WALK_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+HASH_SUFFIXES = {".js", ".mjs", ".cjs"}
+HASH_DIRS = {".claude", ".vscode", "node_modules"}
+SHA256_HEX_RE = re.compile(r"[0-9a-fA-F]{64}")
+VERIFIED_PACKAGES_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS verified_packages (path TEXT NOT NULL, integrity TEXT NOT NULL, "
+    "signature TEXT NOT NULL, PRIMARY KEY (path, integrity)) WITHOUT ROWID"
+)
+FILE_HASHES_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS file_hashes (dev INTEGER NOT NULL, ino INTEGER NOT NULL, size INTEGER NOT NULL, "
+    "mtime_ns INTEGER NOT NULL, sha256 TEXT NOT NULL, PRIMARY KEY (dev, ino)) WITHOUT ROWID"
+)
 SEMVER_RE = re.compile(r"(?P<major>0|[1-9]\d*)\.(?P<minor>0|[1-9]\d*)\.(?P<patch>0|[1-9]\d*)")
 
 
@@ -63,37 +148,252 @@ def should_skip_dir(name: str, include_node_modules: bool) -> bool:
     return name == "node_modules" and not include_node_modules
 
 
-def walk_files(root: Path, include_node_modules: bool = False):
-    for dirpath, dirnames, filenames in os.walk(root):
-        dirnames[:] = [d for d in dirnames if not should_skip_dir(d, include_node_modules)]
-        current = Path(dirpath)
-        for filename in filenames:
-            yield current / filename
+@dataclass
+class FileEntry:
+    name: str
+    relative: str
+    path: str
+    dir_entry: os.DirEntry[str] | None = field(default=None, repr=False)
 
+    @property
+    def suffix(self) -> str:
+        return os.path.splitext(self.name)[1]
 
-def read_text(path: Path) -> str:
+    def stat(self) -> os.stat_result:
+        return self.dir_entry.stat() if self.dir_entry else os.stat(self.path)
+
+
+def list_dir(
+    path: str, relative: str, include_node_modules: bool, node_modules: list[str] | None = None
+) -> tuple[list[FileEntry], list[tuple[str, str]]]:
+    # Skipped node_modules directories are appended to node_modules, when given, for the installed-package phases.
+    files: list[FileEntry] = []
+    subdirs: list[tuple[str, str]] = []
+    try:
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError:
+        return files, subdirs
+    for entry in entries:
+        child = os.path.join(relative, entry.name) if relative else entry.name
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if not is_dir:
+            files.append(FileEntry(entry.name, child, entry.path, entry))
+            continue
+        if node_modules is not None and entry.name == "node_modules" and not include_node_modules:
+            node_modules.append(entry.path)
+        if not entry.is_symlink() and not should_skip_dir(entry.name, include_node_modules):
+            subdirs.append((entry.path, child))
+    return files, subdirs
+
+
+def walk_files(
+    root: Path, include_node_modules: bool = False, node_modules: list[str] | None = None
+) -> Iterator[FileEntry]:
+    # Workers list directories ahead of the consumer; results are yielded in
+    # sorted depth-first order so reports do not depend on thread timing.
+    # node_modules, when given, collects the skipped node_modules directories
+    # in that same order, so later phases need not walk the tree again.
+    pool = ThreadPoolExecutor(max_workers=WALK_WORKERS)
+
+    def visit(path: str, relative: str) -> tuple[list[FileEntry], list[Future[Any]], list[str]]:
+        skipped: list[str] = []
+        files, subdirs = list_dir(path, relative, include_node_modules, skipped)
+        children: list[Future[Any]] = []
+        for subdir, child in subdirs:
+            try:
+                children.append(pool.submit(visit, subdir, child))
+            except RuntimeError:
+                break
+        return files, children, skipped
+
+    pending = [pool.submit(visit, str(root), "")]
+    try:
+        while pending:
+            files, children, skipped = pending.pop().result()
+            if node_modules is not None:
+                node_modules.extend(skipped)
+            yield from files
+            pending.extend(reversed(children))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def read_text(path: str | Path) -> str:
     try:
-        return path.read_text(errors="ignore")
+        with open(path, errors="ignore") as handle:
+            return handle.read()
     except OSError:
         return ""
 
 
-def load_json(path: Path) -> Any:
+def read_bytes(path: str | Path) -> bytes:
+    try:
+        with open(path, "rb") as handle:
+            return handle.read()
+    except OSError:
+        return b""
+
+
+def load_json(path: str | Path) -> Any:
     try:
         return json.loads(read_text(path))
     except json.JSONDecodeError:
         return None
 
 
-def file_mtime(path: Path) -> datetime:
-    return datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.utc)
-
-
-def run(cmd: list[str], cwd: Path) -> subprocess.CompletedProcess[str] | None:
+def file_mtime(stat: os.stat_result) -> datetime:
+    return datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+
+
+@dataclass
+class Instrumentation:
+    top_files: int = 10
+    phases: dict[str, dict[str, float]] = field(default_factory=dict)
+    counters: dict[str, float] = field(default_factory=lambda: dict.fromkeys(INSTRUMENTATION_COUNTERS, 0))
+    slowest: list[tuple[float, str]] = field(default_factory=list)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        # Phases accumulate, so per-file work (read, ioc_matching, ...) sums across files.
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def add(self, name: str, wall: float, cpu: float, calls: int = 1) -> None:
+        totals = self.phases.setdefault(name, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "calls": 0})
+        totals["wall_seconds"] += wall
+        totals["cpu_seconds"] += cpu
+        totals["calls"] += calls
+
+    def count(self, key: str, amount: float = 1) -> None:
+        self.counters[key] += amount
+
+    def file(self, relative: str, seconds: float) -> None:
+        if len(self.slowest) < self.top_files:
+            heapq.heappush(self.slowest, (seconds, relative))
+        elif self.slowest and seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, relative))
+
+    def report(self) -> dict[str, Any]:
+        phases = {name: {key: round(value, 6) for key, value in totals.items()} for name, totals in self.phases.items()}
+        slowest = sorted(self.slowest, reverse=True)
+        return {
+            "phases": phases,
+            "counters": {key: round(value, 6) for key, value in self.counters.items()},
+            "slowest_files": [{"file": relative, "seconds": round(seconds, 6)} for seconds, relative in slowest],
+        }
+
+
+def timed(instrumentation: Instrumentation | None, name: str) -> AbstractContextManager[None]:
+    return instrumentation.phase(name) if instrumentation else nullcontext()
+
+
+def timed_iter(items: Iterable[FileEntry], instrumentation: Instrumentation, name: str) -> Iterator[FileEntry]:
+    # Time spent waiting on the walker, excluding the per-file work done by the consumer.
+    iterator = iter(items)
+    wall = cpu = 0.0
+    calls = 0
     try:
-        return subprocess.run(cmd, cwd=cwd, check=False, capture_output=True, text=True, timeout=8)
-    except (OSError, subprocess.TimeoutExpired):
-        return None
+        while True:
+            started, cpu_started = time.perf_counter(), time.process_time()
+            item = next(iterator, None)
+            wall += time.perf_counter() - started
+            cpu += time.process_time() - cpu_started
+            if item is None:
+                return
+            calls += 1
+            yield item
+    finally:
+        instrumentation.add(name, wall, cpu, calls)
+
+
+class ProbeTimeout(TimeoutError):
+    def __init__(self, limit: str) -> None:
+        super().__init__(limit)
+        self.limit = limit
+
+
+@dataclass
+class ScanContext:
+    root: Path
+    subprocess_count: int = 0
+    config_texts: dict[str, str] | None = None
+    instrumentation: Instrumentation | None = None
+    probe_budget: float = PROBE_BUDGET_SECONDS
+    # Probe name ("version" or a PNPM_POLICY_KEYS setting) -> the limit that cut it off.
+    probe_timeouts: dict[str, str] = field(default_factory=dict)
+    _policy: dict[str, Any] | None = field(default=None, repr=False)
+
+    def run(self, cmd: list[str]) -> subprocess.CompletedProcess[str] | None:
+        started = time.perf_counter()
+        try:
+            result = subprocess.run(
+                cmd, cwd=self.root, check=False, capture_output=True, text=True, timeout=SUBPROCESS_TIMEOUT_SECONDS
+            )
+        except OSError:
+            return None
+        except subprocess.TimeoutExpired:
+            result = None
+        self.counted(started)
+        return result
+
+    async def probe(self, cmd: list[str], deadline: float) -> subprocess.CompletedProcess[str] | None:
+        # Raises ProbeTimeout when the probe outlives the shared deadline or the per-command timeout.
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ProbeTimeout(PROBE_BUDGET_LIMIT)
+        started = time.perf_counter()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                cwd=self.root,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                start_new_session=True,
+            )
+        except OSError:
+            return None
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate(), min(SUBPROCESS_TIMEOUT_SECONDS, remaining)
+            )
+        except asyncio.TimeoutError:
+            # Kill the whole group: a child left holding the pipes would keep the probe alive.
+            with suppress(ProcessLookupError):
+                os.killpg(process.pid, signal.SIGKILL)
+            await process.wait()
+            limit = PROBE_BUDGET_LIMIT if remaining < SUBPROCESS_TIMEOUT_SECONDS else COMMAND_LIMIT
+            raise ProbeTimeout(limit) from None
+        finally:
+            self.counted(started)
+        return subprocess.CompletedProcess(
+            cmd, process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+        )
+
+    def counted(self, started: float) -> None:
+        self.subprocess_count += 1
+        if self.instrumentation:
+            self.instrumentation.count("subprocesses")
+            self.instrumentation.count("subprocess_seconds", time.perf_counter() - started)
+
+    @property
+    def policy(self) -> dict[str, Any]:
+        if self._policy is None:
+            self._policy = package_manager_policy(self)
+        return self._policy
+
+    @property
+    def repo_config(self) -> dict[str, str]:
+        if self.config_texts is None:
+            self.config_texts = repo_config_text(self.root)
+        return self.config_texts
 
 
 def parse_semver(value: str) -> tuple[int, int, int] | None:
@@ -103,8 +403,12 @@ def parse_semver(value: str) -> tuple[int, int, int] | None:
     return (int(match.group("major")), int(match.group("minor")), int(match.group("patch")))
 
 
-def pnpm_cli_version(root: Path) -> str | None:
-    result = run(["pnpm", "--version"], root)
+async def pnpm_cli_version(context: ScanContext, deadline: float) -> str | None:
+    try:
+        result = await context.probe(["pnpm", "--version"], deadline)
+    except ProbeTimeout as error:
+        context.probe_timeouts["version"] = error.limit
+        return PROBE_UNKNOWN
     if not result or result.returncode != 0:
         return None
     return result.stdout.strip() or None
@@ -180,23 +484,71 @@ def package_json_script_risks(root: Path, path: Path, data: Any) -> list[dict[st
     return risks
 
 
-def effective_pnpm_config(root: Path) -> dict[str, str | None]:
+def pnpm_config_value(raw: Any) -> str | None:
+    if raw is None:
+        return None
+    if isinstance(raw, bool):
+        candidate = "true" if raw else "false"
+    elif isinstance(raw, (int, float, str)):
+        candidate = str(raw).strip()
+    else:
+        candidate = json.dumps(raw)
+    if candidate and candidate != "undefined":
+        return candidate
+    return None
+
+
+async def listed_pnpm_config(context: ScanContext, deadline: float) -> dict[str, Any]:
+    try:
+        result = await context.probe(["pnpm", "config", "list", "--json"], deadline)
+    except ProbeTimeout:
+        return {}  # every setting falls back to its own lookup
+    if not result or result.returncode != 0:
+        return {}
+    try:
+        data = json.loads(result.stdout)
+    except json.JSONDecodeError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+async def pnpm_config_get(context: ScanContext, aliases: tuple[str, ...], deadline: float) -> str | None:
+    for key in aliases:
+        try:
+            result = await context.probe(["pnpm", "config", "get", key], deadline)
+        except ProbeTimeout as error:
+            context.probe_timeouts[aliases[0]] = error.limit  # the canonical name comes first
+            return PROBE_UNKNOWN
+        if not result or result.returncode != 0:
+            continue
+        value = pnpm_config_value(result.stdout)
+        if value is not None:
+            return value
+    return None
+
+
+async def effective_pnpm_config(context: ScanContext, deadline: float) -> dict[str, str | None]:
+    listed = await listed_pnpm_config(context, deadline)
     values: dict[str, str | None] = {}
     for canonical, aliases in PNPM_POLICY_KEYS.items():
-        value: str | None = None
-        for key in aliases:
-            result = run(["pnpm", "config", "get", key], root)
-            if not result or result.returncode != 0:
-                continue
-            candidate = result.stdout.strip()
-            if candidate and candidate != "undefined":
-                value = candidate
-                break
-        values[canonical] = value
+        values[canonical] = next(
+            (v for v in (pnpm_config_value(listed.get(key)) for key in aliases) if v is not None), None
+        )
+    # Settings missing from the listing are looked up one key per probe, all keys at once.
+    missing = [canonical for canonical, value in values.items() if value is None]
+    found = await asyncio.gather(*(pnpm_config_get(context, PNPM_POLICY_KEYS[key], deadline) for key in missing))
+    values.update(zip(missing, found))
     return values
 
 
-def package_manager_policy(root: Path) -> dict[str, Any]:
+async def pnpm_probes(context: ScanContext) -> tuple[str | None, dict[str, str | None]]:
+    # One deadline for every probe: a hung pnpm costs at most --probe-budget per policy, not 8s per command.
+    deadline = time.monotonic() + context.probe_budget
+    return await asyncio.gather(pnpm_cli_version(context, deadline), effective_pnpm_config(context, deadline))
+
+
+def package_manager_policy(context: ScanContext) -> dict[str, Any]:
+    root = context.root
     package_json = root / "package.json"
     package_manager = ""
     dev_engine_pm: dict[str, Any] | None = None
@@ -214,13 +566,21 @@ def package_manager_policy(root: Path) -> dict[str, Any]:
         "yarn": (root / "yarn.lock").exists(),
         "bun": (root / "bun.lock").exists() or (root / "bun.lockb").exists(),
     }
-    effective = effective_pnpm_config(root)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        version, effective = asyncio.run(pnpm_probes(context))
+    else:
+        # Called from an event loop (an async host using Scanner): probe on a loop of our own.
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            version, effective = pool.submit(asyncio.run, pnpm_probes(context)).result()
     policy = {
         "packageManager": package_manager,
         "devEnginesPackageManager": dev_engine_pm,
-        "effective_pnpm_version": pnpm_cli_version(root),
+        "effective_pnpm_version": version,
         "lockfiles": lockfiles,
         "effective_pnpm_config": effective,
+        "probe_timeouts": dict(sorted(context.probe_timeouts.items())),
         "uses_pnpm": package_manager.startswith("pnpm@")
         or (isinstance(dev_engine_pm, dict) and dev_engine_pm.get("name") == "pnpm")
         or lockfiles["pnpm"],
@@ -231,16 +591,16 @@ def package_manager_policy(root: Path) -> dict[str, Any]:
 
 
 def repo_config_text(root: Path) -> dict[str, str]:
-    return {p.name: read_text(p) for p in walk_files(root) if p.name in CONFIG_FILES}
+    return {entry.name: read_text(entry.path) for entry in walk_files(root) if entry.name in CONFIG_FILES}
 
 
 def has_pnpm_setting(text: str, canonical: str) -> bool:
     return any(alias in text for alias in PNPM_POLICY_KEYS[canonical])
 
 
-def repo_config_findings(root: Path) -> list[str]:
-    files = repo_config_text(root)
-    policy = package_manager_policy(root)
+def repo_config_findings(context: ScanContext) -> list[str]:
+    files = context.repo_config
+    policy = context.policy
     pnpm_workspace = files.get("pnpm-workspace.yaml", "")
     npmrc = files.get(".npmrc", "")
     bunfig = files.get("bunfig.toml", "")
@@ -278,15 +638,15 @@ def repo_config_findings(root: Path) -> list[str]:
     return findings
 
 
-def effective_config_findings(root: Path) -> list[str]:
-    policy = package_manager_policy(root)
+def effective_config_findings(context: ScanContext) -> list[str]:
+    policy = context.policy
     findings: list[str] = []
     manager = policy["manager"]
     if manager == "npm":
         findings.append("npm fallback: use npm ci, committed package-lock.json, and exact specs while migrating to pnpm 11")
         return findings
     if manager == "bun":
-        files = repo_config_text(root)
+        files = context.repo_config
         bun_findings = bun_config_findings(files.get("bunfig.toml", ""))
         if bun_findings:
             findings.append("bun fallback: use bun install --frozen-lockfile and hardened bunfig.toml")
@@ -302,7 +662,10 @@ def effective_config_findings(root: Path) -> list[str]:
     for setting in PNPM_POLICY_KEYS:
         if effective.get(setting) is None:
             findings.append(f"effective pnpm missing {setting}")
-    if effective.get("dangerouslyAllowAllBuilds", "").lower() == "true":
+        elif effective[setting] == PROBE_UNKNOWN:
+            limit = policy["probe_timeouts"].get(setting, PROBE_BUDGET_LIMIT)
+            findings.append(f"effective pnpm {setting} unknown: probe exceeded {limit}")
+    if (effective.get("dangerouslyAllowAllBuilds") or "").lower() == "true":
         findings.append("effective dangerouslyAllowAllBuilds is true")
     return findings
 
@@ -354,88 +717,1441 @@ def pnpm_version_findings(policy: dict[str, Any]) -> list[str]:
             if "11" not in raw_version:
                 findings.append(f"devEngines.packageManager must require pnpm >=11: {raw_version}")
     effective_version = policy.get("effective_pnpm_version")
-    if isinstance(effective_version, str):
+    if effective_version == PROBE_UNKNOWN:
+        limit = policy.get("probe_timeouts", {}).get("version", PROBE_BUDGET_LIMIT)
+        findings.append(f"effective pnpm version unknown: probe exceeded {limit}")
+    elif isinstance(effective_version, str):
         parsed = parse_semver(effective_version)
         if parsed and parsed[0] < 11:
             findings.append(f"legacy-pnpm-major: effective pnpm is {effective_version}")
     return sorted(set(findings))
 
 
-def ci_install_findings(root: Path, path: Path, text: str) -> list[dict[str, str]]:
+WORKFLOW_TOKENS = (
+    ("npm_install", r"\bnpm\s+install\b"),
+    ("yarn_install", r"\byarn\s+install\b"),
+    ("bun_install", r"\bbun\s+install\b"),
+    ("pnpm_install", r"\bpnpm\s+install\b"),
+    ("secret_json", r"toJSON\(secrets\)"),
+    ("publish", r"\b(?:npm|pnpm|bun)\s+publish\b"),
+    ("id_token", r"\bid-token:\s*write\b"),
+    ("release", r"(?i:\b(?:npm publish|trusted publishing|release)\b)"),
+    ("pull_request_target", r"\bpull_request_target\s*:"),
+    ("cache", r"actions/cache(?:@|/)|cache-dependency-path|restore-keys:|\b(?:turbo|turbo\.json|TURBO_|nx|NX_)\b"),
+)
+# The leading class lists every token's possible first character, which lets the
+# regex engine skip ahead with a charset scan instead of trying each branch per offset.
+WORKFLOW_TOKEN_RE = re.compile(
+    "(?=[abcinprtyNRT])(?:" + "|".join(f"(?P<{name}>{pattern})" for name, pattern in WORKFLOW_TOKENS) + ")"
+)
+# Reasons tied to one token; frozen-lockfile installs are filtered per line.
+WORKFLOW_TOKEN_REASONS = {
+    "npm_install": "npm-install",
+    "yarn_install": "yarn-install",
+    "bun_install": "bun-install-not-frozen",
+    "pnpm_install": "pnpm-install-not-frozen",
+    "secret_json": "secret-json-export",
+}
+CI_INSTALL_REASONS = (
+    "npm-install",
+    "yarn-install",
+    "bun-install-not-frozen",
+    "pnpm-install-not-frozen",
+    "secret-json-export",
+    "npm-publish",
+)
+STEP_LABEL_KEYS = ("name", "id", "uses", "run")
+WORKFLOW_KEY_RE = re.compile(r"^( *)(- +)?([\w.-]+|\"[^\"]*\"|'[^']*') *:(?: |$)(.*)")
+
+
+def workflow_outline(lines: list[str]) -> tuple[list[tuple[str | None, int | None]], dict[tuple[str, int], str]]:
+    # Maps each line to its (job, step number) without a YAML parser: job keys are
+    # the first indentation level under `jobs:`, steps are `-` items under `steps:`.
+    # Deeper lines (run: | blocks, with: maps) inherit the enclosing step.
+    outline: list[tuple[str | None, int | None]] = []
+    labels: dict[tuple[str, int], tuple[int, str]] = {}
+    job: str | None = None
+    job_indent = steps_indent = dash_indent = None
+    step: int | None = None
+    in_jobs = False
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            outline.append((job, step))
+            continue
+        indent = len(line) - len(line.lstrip(" "))
+        match = WORKFLOW_KEY_RE.match(line)
+        if indent == 0:
+            in_jobs = bool(match and match.group(3) == "jobs")
+            job = job_indent = steps_indent = dash_indent = step = None
+        elif in_jobs and (job_indent is None or indent <= job_indent):
+            if match and not match.group(2):
+                job, job_indent = match.group(3).strip("\"'"), indent
+            steps_indent = dash_indent = step = None
+        elif job is not None:
+            if steps_indent is not None and stripped.startswith("-") and indent >= steps_indent:
+                if dash_indent is None:
+                    dash_indent = indent
+                if indent == dash_indent:
+                    step = (step or 0) + 1
+            elif steps_indent is not None and indent <= steps_indent:
+                steps_indent = dash_indent = step = None
+            if match and step is None and match.group(3) == "steps":
+                steps_indent = indent
+            elif match and step is not None and dash_indent is not None:
+                key_indent = indent + len(match.group(2) or "")
+                if key_indent == dash_indent + 2 and match.group(3) in STEP_LABEL_KEYS:
+                    value = match.group(4).strip().strip("\"'")
+                    if value and value[0] not in "|>":
+                        # Prefer the step name, then id, uses, and finally the command itself.
+                        label = (STEP_LABEL_KEYS.index(match.group(3)), value[:80])
+                        labels[(job, step)] = min(label, labels.get((job, step), label))
+        outline.append((job, step))
+    return outline, {key: label for key, (_, label) in labels.items()}
+
+
+def workflow_reasons(text: str) -> list[tuple[str, int]]:
+    # One pass over the combined token pattern; returns each reason with the offset
+    # of the token that first triggered it.
+    first: dict[str, int] = {}
+    for match in WORKFLOW_TOKEN_RE.finditer(text):
+        token, offset = match.lastgroup or "", match.end() - 1
+        if token == "pull_request_target":
+            if text[text.rfind("\n", 0, match.start()) + 1 : match.start()].strip():
+                continue  # only a trigger key counts, not a mention later in the line
+        elif token in {"bun_install", "pnpm_install"}:
+            line_end = text.find("\n", match.end())
+            if text.find("--frozen-lockfile", match.end(), line_end if line_end >= 0 else len(text)) >= 0:
+                continue
+        if token in WORKFLOW_TOKEN_REASONS:
+            first.setdefault(WORKFLOW_TOKEN_REASONS[token], offset)
+        elif token == "publish":
+            if not match.group().startswith("bun"):
+                first.setdefault("npm-publish", offset)
+            first.setdefault("publish", offset)
+        elif token in {"id_token", "release"}:
+            first.setdefault("publish", offset)
+        else:
+            first.setdefault(token, offset)
+
+    reasons = [(reason, first[reason]) for reason in CI_INSTALL_REASONS if reason in first]
+    risks: list[tuple[str, int]] = []
+    target, cache = first.get("pull_request_target"), first.get("cache")
+    if target is not None:
+        risks.append(
+            ("workflow uses pull_request_target; verify it never checks out or runs untrusted PR code", target)
+        )
+    if cache is not None and "publish" in first:
+        risks.append(
+            ("publish/release workflow uses shared cache; verify PR-contaminated caches cannot feed publishing", cache)
+        )
+    elif cache is not None:
+        risks.append(("workflow uses shared cache; verify cache keys cannot be poisoned by untrusted PR jobs", cache))
+    if target is not None and cache is not None:
+        # Point at the job that uses the cache: that is where untrusted content can enter.
+        risks.append(
+            ("pull_request_target combined with shared cache; high-risk if cache reaches privileged jobs", cache)
+        )
+    return reasons + sorted(risks)
+
+
+def ci_install_findings(
+    root: Path, path: Path, text: str, instrumentation: Instrumentation | None = None
+) -> list[dict[str, Any]]:
     if ".github/workflows" not in rel(root, path) or path.suffix not in CI_FILES:
         return []
-    findings: list[dict[str, str]] = []
-    checks = {
-        "npm-install": r"\bnpm\s+install\b",
-        "yarn-install": r"\byarn\s+install\b",
-        "bun-install-not-frozen": r"\bbun\s+install\b(?![^\n]*--frozen-lockfile)",
-        "pnpm-install-not-frozen": r"\bpnpm\s+install\b(?![^\n]*--frozen-lockfile)",
-        "secret-json-export": r"toJSON\(secrets\)",
-        "npm-publish": r"\bnpm\s+publish\b|\bpnpm\s+publish\b",
-    }
-    for reason, pattern in checks.items():
-        if re.search(pattern, text):
-            findings.append({"file": rel(root, path), "reason": reason})
-    workflow_risks = github_workflow_risks(text)
-    findings.extend({"file": rel(root, path), "reason": reason} for reason in workflow_risks)
+    if instrumentation:
+        instrumentation.count("regex_evaluations")
+    reasons = workflow_reasons(text)
+    if not reasons:
+        return []
+    # Jobs and steps are only outlined up to the last line that triggered a reason.
+    end = text.find("\n", max(offset for _, offset in reasons))
+    outline, labels = workflow_outline(text[: end if end >= 0 else len(text)].split("\n"))
+    findings: list[dict[str, Any]] = []
+    for reason, offset in reasons:
+        number = text.count("\n", 0, offset) + 1
+        job, step = outline[number - 1]
+        step_label = None
+        if job is not None and step is not None:
+            step_label = labels.get((job, step), f"#{step}")
+        findings.append({"file": rel(root, path), "reason": reason, "job": job, "step": step_label, "line": number})
     return findings
 
 
-def github_workflow_risks(text: str) -> list[str]:
-    reasons: list[str] = []
-    has_pull_request_target = bool(re.search(r"(?m)^\s*pull_request_target\s*:", text))
-    has_cache = bool(
-        re.search(r"actions/cache(?:@|/)|cache-dependency-path|restore-keys:", text)
-        or re.search(r"\b(turbo|turbo\.json|TURBO_|nx|NX_)\b", text)
-    )
-    has_publish = bool(
-        re.search(r"\b(npm|pnpm|bun)\s+publish\b", text)
-        or re.search(r"\bnpm\s+publish\b", text)
-        or re.search(r"\bid-token:\s*write\b", text)
-        or re.search(r"\b(npm publish|trusted publishing|release)\b", text, re.IGNORECASE)
-    )
-    if has_pull_request_target:
-        reasons.append("workflow uses pull_request_target; verify it never checks out or runs untrusted PR code")
-    if has_cache and has_publish:
-        reasons.append("publish/release workflow uses shared cache; verify PR-contaminated caches cannot feed publishing")
-    elif has_cache:
-        reasons.append("workflow uses shared cache; verify cache keys cannot be poisoned by untrusted PR jobs")
-    if has_pull_request_target and has_cache:
-        reasons.append("pull_request_target combined with shared cache; high-risk if cache reaches privileged jobs")
-    return sorted(set(reasons))
-
-
-def installed_package_metadata(root: Path) -> list[Path]:
-    files: list[Path] = []
-    for nm in root.rglob("node_modules"):
-        pnpm = nm / ".pnpm"
-        if not pnpm.is_dir():
+def node_modules_dirs(root: Path) -> list[str]:
+    found: list[str] = []
+    for dirpath, dirnames, _ in os.walk(root):
+        if "node_modules" in dirnames:
+            found.append(os.path.join(dirpath, "node_modules"))
+        dirnames[:] = sorted(d for d in dirnames if not should_skip_dir(d, False))
+    return found
+
+
+def real_subdirs(path: str) -> list[os.DirEntry[str]]:
+    try:
+        with os.scandir(path) as it:
+            entries = [entry for entry in it if entry.is_dir(follow_symlinks=False)]
+    except OSError:
+        return []
+    return sorted(entries, key=lambda entry: entry.name)
+
+
+def package_roots(node_modules: str) -> Iterator[str]:
+    # Flat npm/yarn layout: node_modules/<name> or node_modules/@scope/<name>,
+    # with conflicting versions nested under <package>/node_modules. Symlinked
+    # entries (pnpm's top level, workspace links) are skipped: their targets are
+    # enumerated on their own.
+    for entry in real_subdirs(node_modules):
+        if entry.name.startswith("."):
             continue
-        for package_json in pnpm.glob("*/node_modules/**/package.json"):
-            files.append(package_json)
+        candidates = real_subdirs(entry.path) if entry.name.startswith("@") else [entry]
+        for candidate in candidates:
+            yield candidate.path
+            nested = os.path.join(candidate.path, "node_modules")
+            if os.path.isdir(nested):
+                yield from package_roots(nested)
+
+
+def pnpm_package_roots(node_modules: str) -> Iterator[str]:
+    # pnpm virtual store: .pnpm/<name>@<version>/node_modules/<name>; sibling
+    # entries in that node_modules are symlinks to other store entries.
+    for store_entry in real_subdirs(os.path.join(node_modules, ".pnpm")):
+        if store_entry.name == "node_modules":
+            continue
+        yield from package_roots(os.path.join(store_entry.path, "node_modules"))
+
+
+def inode_key(stat: os.stat_result) -> tuple[int, int, int, int]:
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+@dataclass
+class SharedFiles:
+    """Content-derived results for files reachable through several paths.
+
+    pnpm hardlinks package files from its store into every project, so results
+    are keyed by inode (plus size and mtime); with ``hash_content`` installed
+    package.json files with identical bytes also share one parse. Large parses
+    run on one process pool, started on first use and kept until close().
+    IOC matches are evicted least recently used past SHARED_MATCHES_LIMIT, since
+    every edit to a hardlinked file adds a new key.
+    """
+
+    hash_content: bool = False
+    scripts: dict[tuple[int, int, int, int], tuple[str, list[str]]] = field(default_factory=dict)
+    digests: dict[str, tuple[str, list[str]]] = field(default_factory=dict)
+    matches: OrderedDict[tuple[int, int, int, int], tuple[Any, ...]] = field(default_factory=OrderedDict)
+    pool: ProcessPoolExecutor | None = field(default=None, repr=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def parse(self, function: Callable[[Any], tuple[str, list[str]]], items: list[Any]) -> list[tuple[str, list[str]]]:
+        if len(items) < INSTALLED_POOL_MIN_FILES:
+            return [function(item) for item in items]
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context(POOL_START_METHOD))
+        return list(self.pool.map(function, items, chunksize=256))
+
+    def match(self, key: tuple[int, int, int, int]) -> tuple[Any, ...] | None:
+        with self.lock:
+            cached = self.matches.get(key)
+            if cached is not None:
+                self.matches.move_to_end(key)
+            return cached
+
+    def remember_match(self, key: tuple[int, int, int, int], value: tuple[Any, ...]) -> None:
+        with self.lock:
+            self.matches[key] = value
+            self.matches.move_to_end(key)
+            while len(self.matches) > SHARED_MATCHES_LIMIT:
+                self.matches.popitem(last=False)
+
+    def close(self) -> None:
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+def installed_package_metadata(root: Path, node_modules: list[str] | None = None) -> list[tuple[str, os.stat_result]]:
+    files: list[tuple[str, os.stat_result]] = []
+    for directory in node_modules_dirs(root) if node_modules is None else node_modules:
+        for package_root in (*package_roots(directory), *pnpm_package_roots(directory)):
+            package_json = os.path.join(package_root, "package.json")
+            try:
+                stat = os.stat(package_json)
+            except OSError:
+                continue
+            if S_ISREG(stat.st_mode):
+                files.append((package_json, stat))
     return files
 
 
-def installed_package_findings(root: Path) -> list[dict[str, str]]:
-    findings: list[dict[str, str]] = []
-    for package_json in installed_package_metadata(root):
-        data = load_json(package_json)
-        if not isinstance(data, dict):
+def installed_package_scripts(package_json: str) -> tuple[str, list[str]]:
+    return package_scripts(load_json(package_json))
+
+
+def installed_package_scripts_from_bytes(payload: bytes) -> tuple[str, list[str]]:
+    try:
+        return package_scripts(json.loads(payload.decode(errors="ignore")))
+    except json.JSONDecodeError:
+        return package_scripts(None)
+
+
+def package_scripts(data: Any) -> tuple[str, list[str]]:
+    if not isinstance(data, dict):
+        return "", []
+    scripts = data.get("scripts")
+    if not isinstance(scripts, dict):
+        return "", []
+    package = f"{data.get('name', '<unknown>')}@{data.get('version', '<unknown>')}"
+    return package, sorted(LIFECYCLE_SCRIPTS & scripts.keys())
+
+
+def installed_package_findings(
+    root: Path,
+    instrumentation: Instrumentation | None = None,
+    shared: SharedFiles | None = None,
+    node_modules: list[str] | None = None,
+) -> Iterator[dict[str, str]]:
+    files = installed_package_metadata(root, node_modules)
+    owned = shared is None
+    shared = shared or SharedFiles()
+    keys = [inode_key(stat) for _, stat in files]
+    # Each inode is parsed once, however many store links point at it.
+    pending: dict[tuple[int, int, int, int], str] = {}
+    for (package_json, _), key in zip(files, keys):
+        if key not in shared.scripts:
+            pending.setdefault(key, package_json)
+    parses = len(pending)
+    if shared.hash_content and pending:
+        digests: dict[tuple[int, int, int, int], str] = {}
+        unseen: dict[str, bytes] = {}
+        for key, package_json in pending.items():
+            payload = read_bytes(package_json)
+            digest = digests[key] = hashlib.sha256(payload).hexdigest()
+            if digest not in shared.digests:
+                unseen.setdefault(digest, payload)
+        parses = len(unseen)
+        parsed = shared.parse(installed_package_scripts_from_bytes, list(unseen.values()))
+        for digest, result in zip(unseen, parsed):
+            shared.digests[digest] = result
+        for key, digest in digests.items():
+            shared.scripts[key] = shared.digests[digest]
+    elif pending:
+        for key, result in zip(pending, shared.parse(installed_package_scripts, list(pending.values()))):
+            shared.scripts[key] = result
+    if owned:
+        shared.close()
+    if instrumentation:
+        instrumentation.count("json_parses", parses)
+        instrumentation.count("shared_file_hits", len(files) - parses)
+    for (package_json, _), key in zip(files, keys):
+        package, scripts = shared.scripts[key]
+        if scripts:
+            relative = os.path.relpath(package_json, root)
+            yield from ({"file": relative, "package": package, "script": name} for name in scripts)
+
+
+ResolvedIndex = dict[str, dict[str, list[int]]]
+
+
+def add_resolved(index: ResolvedIndex, name: str, version: str, line: int) -> None:
+    if name and version:
+        index.setdefault(name, {}).setdefault(version, []).append(line)
+
+
+def split_name_version(spec: str) -> tuple[str, str]:
+    at = spec.find("@", 1)
+    if at < 0:
+        return spec, ""
+    return spec[:at], spec[at + 1 :]
+
+
+def unquote(value: str) -> str:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        return value[1:-1]
+    return value
+
+
+def pnpm_package_key(key: str, slash_versions: bool) -> tuple[str, str]:
+    key = unquote(key).lstrip("/")
+    key = key.split("(", 1)[0]
+    if slash_versions:
+        name, _, version = key.rpartition("/")
+        return name, version.split("_", 1)[0]
+    return split_name_version(key)
+
+
+PNPM_LOCK_KEY_RE = re.compile(r"^  (\S.*?):(?:\s*\{\})?\s*$")
+
+
+def parse_pnpm_lock(path: str) -> ResolvedIndex:
+    index: ResolvedIndex = {}
+    section = ""
+    slash_versions = False
+    with open(path, errors="ignore") as handle:
+        for number, line in enumerate(handle, 1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            if not line[0].isspace():
+                section = line.split(":", 1)[0].strip()
+                if section == "lockfileVersion":
+                    slash_versions = unquote(line.split(":", 1)[1]).startswith("5")
+                continue
+            if section not in {"packages", "snapshots"}:
+                continue
+            match = PNPM_LOCK_KEY_RE.match(line)
+            if not match:
+                continue
+            name, version = pnpm_package_key(match.group(1), slash_versions)
+            add_resolved(index, name, version, number)
+    return index
+
+
+def parse_yarn_lock(path: str) -> ResolvedIndex:
+    index: ResolvedIndex = {}
+    names: list[str] = []
+    header_line = 0
+    with open(path, errors="ignore") as handle:
+        for number, line in enumerate(handle, 1):
+            stripped = line.strip()
+            if not stripped or stripped.startswith("#"):
+                continue
+            if not line[0].isspace():
+                names = []
+                header_line = number
+                if stripped.endswith(":") and not stripped.startswith("__metadata"):
+                    specs = [spec.strip().strip("\"'") for spec in stripped[:-1].split(",")]
+                    names = sorted({split_name_version(spec)[0] for spec in specs if spec})
+                continue
+            if names and not line[2:3].isspace() and stripped.split()[0] in {"version", "version:"}:
+                version = unquote(stripped[len("version") :].lstrip(":").strip())
+                for name in names:
+                    add_resolved(index, name, version, header_line)
+                names = []
+    return index
+
+
+NPM_LOCK_LINE_RE = re.compile(r'^\s*"((?:[^"\\]|\\.)*)"\s*:\s*(.*?),?\s*$')
+
+
+def npm_lock_package_name(stack: list[str]) -> str | None:
+    if len(stack) == 2 and stack[0] == "packages" and "node_modules/" in stack[1]:
+        return stack[1].rsplit("node_modules/", 1)[1]
+    # lockfileVersion 1: entries nest as dependencies -> name -> dependencies -> name.
+    if len(stack) % 2 == 0 and all(key == "dependencies" for key in stack[::2]):
+        return stack[-1]
+    return None
+
+
+def parse_npm_lock(path: str) -> ResolvedIndex:
+    index: ResolvedIndex = {}
+    stack: list[str] = []
+    fields: list[dict[str, Any]] = []
+    with open(path, errors="ignore") as handle:
+        first = handle.readline()
+        if first.strip() != "{":
+            # Not npm's pretty-printed layout; fall back to a full parse.
+            return npm_lock_index_from_json(load_json(path))
+        for number, line in enumerate(handle, 2):
+            stripped = line.strip()
+            if stripped in {"{", "["}:
+                stack.append("[")
+                fields.append({})
+                continue
+            if stripped in {"}", "},", "]", "],"}:
+                if not stack:
+                    continue
+                key = stack.pop()
+                entry = fields.pop()
+                if key == "[":
+                    continue
+                name = npm_lock_package_name([*stack, key])
+                if name and "version" in entry:
+                    add_resolved(index, entry.get("name") or name, entry["version"], entry["_line"])
+                continue
+            match = NPM_LOCK_LINE_RE.match(line)
+            if not match:
+                continue
+            key, value = match.group(1), match.group(2)
+            if value in {"{", "["}:
+                stack.append(key if value == "{" else "[")
+                fields.append({"_line": number})
+            elif fields and value.startswith('"') and key in {"version", "name"}:
+                fields[-1][key] = unquote(value)
+    return index
+
+
+def npm_lock_index_from_json(data: Any) -> ResolvedIndex:
+    index: ResolvedIndex = {}
+    if not isinstance(data, dict):
+        return index
+    packages = data.get("packages")
+    if isinstance(packages, dict):
+        for key, entry in packages.items():
+            if isinstance(entry, dict) and "node_modules/" in key and isinstance(entry.get("version"), str):
+                name = entry.get("name") if isinstance(entry.get("name"), str) else key.rsplit("node_modules/", 1)[1]
+                add_resolved(index, name, entry["version"], 0)
+    pending = [data.get("dependencies")]
+    while pending:
+        deps = pending.pop()
+        if not isinstance(deps, dict):
+            continue
+        for name, entry in deps.items():
+            if isinstance(entry, dict):
+                if isinstance(entry.get("version"), str):
+                    add_resolved(index, name, entry["version"], 0)
+                pending.append(entry.get("dependencies"))
+    return index
+
+
+BUN_LOCKB_HEADER = b"#!/usr/bin/env bun\nbun-lockfile-format-v0\n"
+# Buffers.save prefixes every array with "<type> size, align"; string_bytes is the only u8 array.
+BUN_LOCKB_STRING_BYTES = b"\n<u8> 1 sizeof, 1 alignof\n"
+# Lockfile.Package is stored column by column, sorted by alignment: name_hash (8), resolution (64),
+# dependencies (8), resolutions (8), meta (88), bin (20), name (8), then scripts (49), which
+# lockfiles written before Bun 0.6.8 lack. Keyed by the stored field count.
+BUN_LOCKB_PACKAGE_BYTES = {7: 204, 8: 253}
+BUN_LOCKB_RESOLUTION_COLUMN = 8
+BUN_LOCKB_NAME_COLUMN = 196
+BUN_RESOLUTION_NPM = 2
+BUN_RESOLUTION_PREFIXES = {
+    4: "file:",
+    8: "file:",
+    16: "github:",
+    32: "git+",
+    64: "link:",
+    72: "workspace:",
+    80: "",
+}
+
+
+def bun_string(mapped: mmap.mmap, offset: int, strings: tuple[int, int]) -> str:
+    # semver.String: up to 8 inline bytes, or (offset, length | 1 << 31) into string_bytes.
+    raw = mapped[offset : offset + 8]
+    if not raw[7] & 0x80:
+        return raw.split(b"\0", 1)[0].decode(errors="replace")
+    start, length = struct.unpack_from("<II", raw)
+    start += strings[0]
+    end = start + (length & 0x7FFFFFFF)
+    if end > strings[1]:
+        raise ValueError("bun.lockb string outside string_bytes")
+    return mapped[start:end].decode(errors="replace")
+
+
+def bun_lockb_packages(path: str) -> Iterator[tuple[str, str | None, str]]:
+    """Yield (name, npm version or None, resolution) for every package in a binary bun.lockb."""
+    with open(path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if mapped[: len(BUN_LOCKB_HEADER)] != BUN_LOCKB_HEADER:
+            raise ValueError("not a bun.lockb file")
+        # Header, u32 format version, 32-byte meta hash, u64 end offset, then the package list.
+        count, _, fields, begin, end = struct.unpack_from("<5Q", mapped, len(BUN_LOCKB_HEADER) + 44)
+        size = BUN_LOCKB_PACKAGE_BYTES.get(fields)
+        if size is None or end > len(mapped) or end - begin != count * size:
+            raise ValueError("unsupported bun.lockb package layout")
+        marker = mapped.find(BUN_LOCKB_STRING_BYTES, end)
+        if marker < 16:
+            raise ValueError("bun.lockb string_bytes not found")
+        strings = struct.unpack_from("<2Q", mapped, marker - 16)
+        if strings[1] > len(mapped):
+            raise ValueError("bun.lockb string_bytes out of range")
+        resolutions = begin + count * BUN_LOCKB_RESOLUTION_COLUMN
+        names = begin + count * BUN_LOCKB_NAME_COLUMN
+        for package in range(count):
+            name = bun_string(mapped, names + package * 8, strings)
+            resolution = resolutions + package * 64
+            tag = mapped[resolution]
+            if tag == BUN_RESOLUTION_NPM:
+                major, minor, patch = struct.unpack_from("<3I", mapped, resolution + 16)
+                version = f"{major}.{minor}.{patch}"
+                pre = bun_string(mapped, resolution + 32, strings)
+                build = bun_string(mapped, resolution + 48, strings)
+                version += (f"-{pre}" if pre else "") + (f"+{build}" if build else "")
+                yield name, version, bun_string(mapped, resolution + 8, strings)
+            elif tag in {16, 32}:
+                # Repository: owner, repo (the URL for git), committish, resolved, package_name.
+                owner, repo, committish = (bun_string(mapped, resolution + at, strings) for at in (8, 16, 24))
+                value = f"{owner}/{repo}" if tag == 16 else repo
+                yield name, None, BUN_RESOLUTION_PREFIXES[tag] + value + (f"#{committish}" if committish else "")
+            elif tag in BUN_RESOLUTION_PREFIXES:
+                yield name, None, BUN_RESOLUTION_PREFIXES[tag] + bun_string(mapped, resolution + 8, strings)
+
+
+def parse_bun_lockb(path: str) -> ResolvedIndex:
+    index: ResolvedIndex = {}
+    try:
+        for name, version, _ in bun_lockb_packages(path):
+            if version:
+                add_resolved(index, name, version, 0)
+    except (ValueError, struct.error):
+        # Unknown or damaged layout: callers fall back to text matching.
+        return {}
+    return index
+
+
+LOCKFILE_PARSERS = {
+    "pnpm-lock.yaml": parse_pnpm_lock,
+    "package-lock.json": parse_npm_lock,
+    "npm-shrinkwrap.json": parse_npm_lock,
+    "yarn.lock": parse_yarn_lock,
+    "bun.lockb": parse_bun_lockb,
+}
+
+
+def resolved_packages(entry: FileEntry) -> ResolvedIndex | None:
+    parser = LOCKFILE_PARSERS.get(entry.name)
+    if parser is None:
+        return None
+    try:
+        return parser(entry.path)
+    except OSError:
+        return None
+
+
+INTRODUCING_PATHS_LIMIT = 3
+DEPENDENCY_KEYS = ("dependencies", "devDependencies", "optionalDependencies")
+LOCK_KEY_LINE_RE = re.compile(r"^( *)(\S.*?):(?:\s+(.*?))?\s*$")
+
+
+@dataclass
+class DependencyGraph:
+    # Nodes are interned "name@version" keys; edges live in flat int arrays and are
+    # turned into a reverse (child -> parents) CSR index on first query.
+    keys: list[str] = field(default_factory=list)
+    ids: dict[str, int] = field(default_factory=dict)
+    direct: dict[int, list[str]] = field(default_factory=dict)
+    edge_from: array = field(default_factory=lambda: array("i"))
+    edge_to: array = field(default_factory=lambda: array("i"))
+    parent_offsets: array | None = field(default=None, repr=False)
+    parent_ids: array | None = field(default=None, repr=False)
+    memo: dict[int, list[dict[str, Any]]] = field(default_factory=dict, repr=False)
+
+    def node(self, name: str, version: str) -> int:
+        key = f"{name}@{version}"
+        node = self.ids.get(key)
+        if node is None:
+            node = self.ids[key] = len(self.keys)
+            self.keys.append(key)
+        return node
+
+    def add_edge(self, parent: int, child: int) -> None:
+        self.edge_from.append(parent)
+        self.edge_to.append(child)
+
+    def add_direct(self, importer: str, child: int) -> None:
+        importers = self.direct.setdefault(child, [])
+        if importer not in importers:
+            importers.append(importer)
+
+    def reverse_index(self) -> tuple[array, array]:
+        if self.parent_offsets is None or self.parent_ids is None:
+            offsets = array("i", bytes(4 * (len(self.keys) + 1)))
+            for child in self.edge_to:
+                offsets[child + 1] += 1
+            for node in range(len(self.keys)):
+                offsets[node + 1] += offsets[node]
+            cursor = array("i", offsets)
+            parents = array("i", bytes(4 * len(self.edge_to)))
+            for parent, child in zip(self.edge_from, self.edge_to):
+                parents[cursor[child]] = parent
+                cursor[child] += 1
+            self.parent_offsets, self.parent_ids = offsets, parents
+        return self.parent_offsets, self.parent_ids
+
+    def introducing_paths(self, key: str, limit: int = INTRODUCING_PATHS_LIMIT) -> list[dict[str, Any]]:
+        # Breadth-first over reverse edges, so the first direct dependencies reached
+        # give the shortest chains; results are memoized per node.
+        target = self.ids.get(key)
+        if target is None:
+            return []
+        if target in self.memo:
+            return self.memo[target]
+        offsets, parents = self.reverse_index()
+        toward = array("i", [-2]) * len(self.keys)
+        toward[target] = -1
+        queue = deque([target])
+        paths: list[dict[str, Any]] = []
+        while queue and len(paths) < limit:
+            node = queue.popleft()
+            for importer in self.direct.get(node, ()):
+                chain = [node]
+                while toward[chain[-1]] >= 0:
+                    chain.append(toward[chain[-1]])
+                paths.append({"importer": importer, "path": [self.keys[step] for step in chain]})
+                if len(paths) == limit:
+                    break
+            for parent in parents[offsets[node] : offsets[node + 1]]:
+                if toward[parent] == -2:
+                    toward[parent] = node
+                    queue.append(parent)
+        self.memo[target] = paths
+        return paths
+
+
+def pnpm_dependency_node(graph: DependencyGraph, name: str, value: str, slash_versions: bool) -> int | None:
+    value = unquote(value)
+    if value.startswith(("link:", "file:", "workspace:")):
+        return None  # workspace links are importers in their own right
+    version = value.split("(", 1)[0]
+    if value.startswith("/") or (not slash_versions and version.find("@", 1) > 0):
+        name, version = pnpm_package_key(value, slash_versions)  # aliased: npm:other@1.0.0
+    elif slash_versions:
+        version = version.split("_", 1)[0]
+    return graph.node(name, version) if name and version else None
+
+
+def pnpm_lock_graph(path: str) -> DependencyGraph:
+    graph = DependencyGraph()
+    section = ""
+    slash_versions = False
+    importer = owner = pending = None
+    in_dependencies = False
+    with open(path, errors="ignore") as handle:
+        for line in handle:
+            stripped = line.strip()
+            if not stripped or stripped[0] == "#":
+                continue
+            indent = len(line) - len(line.lstrip(" "))
+            if indent and section in {"packages", "snapshots"}:
+                # Hot path: one `name: version` line per edge, split without the regex.
+                if indent == 6 and in_dependencies and owner is not None:
+                    key, _, value = stripped.partition(": ")
+                    child = pnpm_dependency_node(graph, unquote(key), value, slash_versions) if value else None
+                    if child is not None:
+                        graph.add_edge(owner, child)
+                elif indent == 4:
+                    in_dependencies = stripped in {"dependencies:", "optionalDependencies:"}
+                elif indent == 2:
+                    match = PNPM_LOCK_KEY_RE.match(line)
+                    name, version = pnpm_package_key(match.group(1), slash_versions) if match else ("", "")
+                    owner = graph.node(name, version) if name and version else None
+                continue
+            match = LOCK_KEY_LINE_RE.match(line.rstrip("\n"))
+            if not match:
+                continue
+            key, value = unquote(match.group(2)), match.group(3) or ""
+            if indent == 0:
+                section = key
+                if key == "lockfileVersion":
+                    slash_versions = unquote(value).startswith("5")
+                # Single-project v5/v6 lockfiles list the root's dependencies at the top level.
+                importer = "." if key in DEPENDENCY_KEYS else None
+                in_dependencies = importer is not None
+                continue
+            if section == "importers":
+                if indent == 2:
+                    importer, in_dependencies = key, False
+                    continue
+                if indent == 4:
+                    in_dependencies = key in DEPENDENCY_KEYS
+                    continue
+                depth = indent - 4
+            elif section in DEPENDENCY_KEYS:
+                depth = indent
+            else:
+                continue
+            if not in_dependencies or importer is None:
+                continue
+            # Depth 2 names a direct dependency: inline version (v5) or nested version field (v6+).
+            child = None
+            if depth == 2:
+                pending = None if value else key
+                if value:
+                    child = pnpm_dependency_node(graph, key, value, slash_versions)
+            elif depth == 4 and pending and key == "version":
+                child = pnpm_dependency_node(graph, pending, value, slash_versions)
+            if child is not None:
+                graph.add_direct(importer, child)
+    return graph
+
+
+def npm_resolve(packages: dict[str, Any], location: str, name: str) -> str | None:
+    # Node's lookup: the package's own node_modules, then each enclosing one.
+    while True:
+        candidate = f"{location}/node_modules/{name}" if location else f"node_modules/{name}"
+        if candidate in packages:
+            return candidate
+        if not location:
+            return None
+        location = location.rsplit("/node_modules/", 1)[0] if "/node_modules/" in location else ""
+
+
+NPM_GRAPH_SECTIONS = {"packages", "dependencies"}
+NPM_GRAPH_DEPENDENCY_MAPS = {"dependencies", "optionalDependencies", "peerDependencies", "devDependencies", "requires"}
+NPM_GRAPH_FIELDS = ('"name"', '"version"', '"link"')
+
+
+def json_string(raw: str) -> str:
+    if "\\" not in raw:
+        return raw
+    try:
+        return json.loads(f'"{raw}"')
+    except ValueError:
+        return raw
+
+
+def npm_lock_skeleton(path: str) -> dict[str, Any] | None:
+    # The same line-streaming walk as parse_npm_lock, keeping only what npm_lock_graph reads: entry names,
+    # versions, links and dependency names. Integrity, resolved URLs and the like are never materialized.
+    root: dict[str, Any] = {}
+    frames: list[tuple[str | None, dict[str, Any] | None]] = [(None, root)]
+    with open(path, errors="ignore") as handle:
+        if handle.readline().strip() != "{":
+            return None
+        for line in handle:
+            stripped = line.strip()
+            if stripped in {"}", "},", "]", "],"}:
+                if len(frames) > 1:
+                    frames.pop()
+                continue
+            parent_key, parent = frames[-1]
+            opens = stripped.endswith(("{", "["))
+            if parent is None or stripped in {"{", "["}:
+                # Inside a dropped object or array: only the nesting matters, so skip the regex.
+                if opens:
+                    frames.append(("[", None))
+                continue
+            if not opens and parent_key not in NPM_GRAPH_DEPENDENCY_MAPS and not stripped.startswith(NPM_GRAPH_FIELDS):
+                continue
+            match = NPM_LOCK_LINE_RE.match(line)
+            if not match:
+                continue
+            key, value = sys.intern(json_string(match.group(1))), match.group(2)
+            if opens:
+                keep = value == "{"
+                if keep and parent_key is None:
+                    keep = key in NPM_GRAPH_SECTIONS
+                elif keep and parent_key not in NPM_GRAPH_SECTIONS:
+                    keep = key in NPM_GRAPH_DEPENDENCY_MAPS  # parent is a package entry
+                child: dict[str, Any] | None = {} if keep else None
+                if child is not None:
+                    parent[key] = child
+                frames.append((key, child))
+            elif parent_key in NPM_GRAPH_DEPENDENCY_MAPS:
+                parent[key] = ""  # edges only need the dependency names
+            elif key in {"name", "version"} and value.startswith('"'):
+                parent[key] = json_string(value[1:-1])
+            elif key == "link":
+                parent[key] = value == "true"
+    return root
+
+
+def npm_lock_graph(path: str) -> DependencyGraph:
+    graph = DependencyGraph()
+    data = npm_lock_skeleton(path)
+    if data is None:
+        data = load_json(path)  # not npm's pretty-printed layout
+    if not isinstance(data, dict):
+        return graph
+    packages = data.get("packages")
+    if isinstance(packages, dict):
+        nodes: dict[str, int] = {}
+        for location, entry in packages.items():
+            if isinstance(entry, dict) and "node_modules/" in location and isinstance(entry.get("version"), str):
+                name = entry.get("name")
+                if not isinstance(name, str):
+                    name = location.rsplit("node_modules/", 1)[1]
+                nodes[location] = graph.node(name, entry["version"])
+        for location, entry in packages.items():
+            if not isinstance(entry, dict) or entry.get("link"):
+                continue
+            owner = nodes.get(location)
+            importer = None if owner is not None else location or "."
+            for field_name in ("dependencies", "optionalDependencies", "peerDependencies", "devDependencies"):
+                deps = entry.get(field_name)
+                if not isinstance(deps, dict) or (field_name == "devDependencies" and owner is not None):
+                    continue
+                for name in deps:
+                    child = nodes.get(npm_resolve(packages, location, name) or "")
+                    if child is None:
+                        continue
+                    if owner is not None:
+                        graph.add_edge(owner, child)
+                    elif importer is not None:
+                        graph.add_direct(importer, child)
+        return graph
+
+    # lockfileVersion 1: nested "dependencies" scopes with "requires" ranges.
+    manifest = load_json(Path(path).with_name("package.json"))
+    root_deps = data.get("dependencies") if isinstance(data.get("dependencies"), dict) else {}
+
+    def lookup(scopes: list[dict[str, Any]], name: str) -> int | None:
+        for scope in scopes:
+            entry = scope.get(name)
+            if isinstance(entry, dict) and isinstance(entry.get("version"), str):
+                return graph.node(name, entry["version"])
+        return None
+
+    if isinstance(manifest, dict):
+        for field_name in DEPENDENCY_KEYS:
+            for name in manifest.get(field_name) or {}:
+                child = lookup([root_deps], name)
+                if child is not None:
+                    graph.add_direct(".", child)
+    pending: list[tuple[dict[str, Any], list[dict[str, Any]]]] = [(root_deps, [root_deps])]
+    while pending:
+        deps, scopes = pending.pop()
+        for name, entry in deps.items():
+            if not isinstance(entry, dict) or not isinstance(entry.get("version"), str):
+                continue
+            owner = graph.node(name, entry["version"])
+            nested = entry.get("dependencies") if isinstance(entry.get("dependencies"), dict) else {}
+            chain = [nested, *scopes]
+            for required in entry.get("requires") or {}:
+                child = lookup(chain, required)
+                if child is not None:
+                    graph.add_edge(owner, child)
+            if nested:
+                pending.append((nested, chain))
+    return graph
+
+
+def yarn_lock_graph(path: str) -> DependencyGraph:
+    graph = DependencyGraph()
+    specs: dict[str, int] = {}
+    edges: list[tuple[int | str, str]] = []  # owner node, or workspace importer, -> dependency spec
+    header: list[str] = []
+    owner: int | str | None = None
+    in_dependencies = False
+    with open(path, errors="ignore") as handle:
+        for line in handle:
+            stripped = line.strip()
+            if not stripped or stripped.startswith("#"):
+                continue
+            if not line[0].isspace():
+                header = []
+                owner = None
+                if stripped.endswith(":") and not stripped.startswith("__metadata"):
+                    header = [spec.strip().strip("\"'") for spec in stripped[:-1].split(",") if spec.strip()]
+                    workspace = next((spec for spec in header if "@workspace:" in spec), None)
+                    if workspace:
+                        owner = workspace.split("@workspace:", 1)[1] or "."
+                continue
+            indent = len(line) - len(line.lstrip(" "))
+            if indent == 2:
+                field_name = stripped.split()[0].rstrip(":")
+                in_dependencies = field_name in {"dependencies", "optionalDependencies"}
+                if field_name == "version" and header and not isinstance(owner, str):
+                    version = unquote(stripped[len("version") :].lstrip(":").strip())
+                    name = split_name_version(header[0])[0]
+                    owner = graph.node(name, version)
+                    for spec in header:
+                        specs[spec] = owner
+            elif indent == 4 and in_dependencies and owner is not None:
+                # classic: `name "range"`, berry: `name: range` / `"@scope/name": "npm:range"`
+                name, _, rng = stripped.partition(" ")
+                edges.append((owner, f"{unquote(name.rstrip(':'))}@{unquote(rng.strip())}"))
+    manifest = load_json(Path(path).with_name("package.json"))
+    if isinstance(manifest, dict) and not any(isinstance(owner, str) for owner, _ in edges):
+        for field_name in DEPENDENCY_KEYS:
+            deps = manifest.get(field_name)
+            if isinstance(deps, dict):
+                edges.extend((".", f"{name}@{rng}") for name, rng in deps.items() if isinstance(rng, str))
+    for owner, spec in edges:
+        child = specs.get(spec)
+        if child is None:
+            name, rng = split_name_version(spec)
+            child = specs.get(f"{name}@npm:{rng}")
+        if child is None:
             continue
-        scripts = data.get("scripts")
-        if not isinstance(scripts, dict):
+        if isinstance(owner, str):
+            graph.add_direct(owner, child)
+        else:
+            graph.add_edge(owner, child)
+    return graph
+
+
+LOCKFILE_GRAPHS: dict[str, Callable[[str], DependencyGraph]] = {
+    "pnpm-lock.yaml": pnpm_lock_graph,
+    "package-lock.json": npm_lock_graph,
+    "npm-shrinkwrap.json": npm_lock_graph,
+    "yarn.lock": yarn_lock_graph,
+}
+# These read the sibling package.json for direct dependencies (npm v1, yarn), so introduced_by depends on it too.
+MANIFEST_GRAPHS = {npm_lock_graph, yarn_lock_graph}
+
+
+def annotate_introducers(entry: FileEntry, hits: list[dict[str, Any]]) -> None:
+    # Only built when a lockfile has a known-bad version, so clean scans never pay for it.
+    builder = LOCKFILE_GRAPHS.get(entry.name)
+    if builder is None or not any(hit["type"] == "package-version" for hit in hits):
+        return
+    try:
+        graph = builder(entry.path)
+    except OSError:
+        return
+    for hit in hits:
+        if hit["type"] == "package-version":
+            hit["introduced_by"] = graph.introducing_paths(hit["value"])
+
+
+PUBLISH_TIMES_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS publish_times ("
+    "name TEXT NOT NULL, version TEXT NOT NULL, published INTEGER NOT NULL, PRIMARY KEY (name, version)"
+    ") WITHOUT ROWID"
+)
+SQLITE_LOOKUP_BATCH = 50_000
+DEFAULT_RELEASE_AGE_DAYS = 7.0
+
+
+@dataclass
+class ReleaseAgeCheck:
+    db: Path
+    min_days: float = DEFAULT_RELEASE_AGE_DAYS
+
+
+def registry_documents(path: str) -> Iterator[Any]:
+    # Exports are packument JSON (one document or a list) or NDJSON, one document per line.
+    with open(path, errors="ignore") as handle:
+        head = handle.read(1 << 16)
+        handle.seek(0)
+        if path.endswith((".ndjson", ".jsonl")) or (head.lstrip().startswith("{") and "}\n{" in head):
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        data = json.load(handle)
+    yield from data if isinstance(data, list) else [data]
+
+
+def registry_publish_rows(document: Any) -> Iterator[tuple[str, str, int]]:
+    if not isinstance(document, dict) or not isinstance(document.get("name"), str):
+        return
+    name = document["name"]
+    times = document.get("time")
+    if isinstance(times, dict):
+        pairs = [(version, value) for version, value in times.items() if version not in {"created", "modified"}]
+    elif isinstance(document.get("version"), str):
+        pairs = [(document["version"], times or document.get("published"))]  # flat {name, version, time}
+    else:
+        return
+    for version, value in pairs:
+        if not isinstance(value, str):
             continue
-        for name in sorted(LIFECYCLE_SCRIPTS & scripts.keys()):
-            findings.append(
-                {
-                    "file": rel(root, package_json),
-                    "package": f"{data.get('name', '<unknown>')}@{data.get('version', '<unknown>')}",
-                    "script": name,
-                }
-            )
+        try:
+            published = parse_since(value)
+        except ValueError:
+            continue
+        if published:
+            yield name, version, int(published.timestamp())
+
+
+def import_publish_times(db: Path, sources: list[str]) -> int:
+    count = 0
+    connection = sqlite3.connect(db)
+    try:
+        with connection:
+            connection.execute(PUBLISH_TIMES_SCHEMA)
+            for source in sources:
+                for document in registry_documents(source):
+                    rows = list(registry_publish_rows(document))
+                    connection.executemany("INSERT OR REPLACE INTO publish_times VALUES (?, ?, ?)", rows)
+                    count += len(rows)
+    finally:
+        connection.close()
+    return count
+
+
+def publish_times_lookup(connection: sqlite3.Connection, pairs: list[tuple[str, str]]) -> dict[tuple[str, str], int]:
+    # One temp-table join per batch instead of a query per resolved package.
+    connection.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (name TEXT NOT NULL, version TEXT NOT NULL)")
+    found: dict[tuple[str, str], int] = {}
+    for start in range(0, len(pairs), SQLITE_LOOKUP_BATCH):
+        connection.execute("DELETE FROM wanted")
+        connection.executemany("INSERT INTO wanted VALUES (?, ?)", pairs[start : start + SQLITE_LOOKUP_BATCH])
+        rows = connection.execute(
+            "SELECT p.name, p.version, p.published FROM wanted w JOIN publish_times p USING (name, version)"
+        )
+        found.update(((name, version), published) for name, version, published in rows)
+    return found
+
+
+def lockfile_changed_at(context: ScanContext, entry: FileEntry) -> datetime:
+    # The last commit touching the lockfile; uncommitted or non-git files use mtime.
+    result = context.run(["git", "log", "-1", "--format=%ct", "--", entry.relative])
+    if result and result.returncode == 0 and result.stdout.strip().isdigit():
+        committed = datetime.fromtimestamp(int(result.stdout.strip()), tz=timezone.utc)
+        status = context.run(["git", "status", "--porcelain", "--", entry.relative])
+        if status and status.returncode == 0 and not status.stdout.strip():
+            return committed
+    return file_mtime(entry.stat())
+
+
+def release_age_findings(
+    context: ScanContext, lockfiles: list[FileEntry], check: ReleaseAgeCheck, ioc_profiles: list[dict[str, Any]]
+) -> list[dict[str, str]]:
+    windows: list[tuple[str, datetime]] = []
+    for profile in ioc_profiles:
+        try:
+            start = parse_since(profile.get("incident_window_start"))
+        except (TypeError, ValueError):
+            start = None
+        if start:
+            windows.append((str(profile.get("name", profile.get("_path"))), start))
+    minimum = timedelta(days=check.min_days)
+    findings: list[dict[str, str]] = []
+    connection = sqlite3.connect(f"{check.db.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        for entry in lockfiles:
+            resolved = resolved_packages(entry) or {}
+            pairs = [(name, version) for name, versions in resolved.items() for version in versions]
+            published = publish_times_lookup(connection, pairs)
+            if not published:
+                continue
+            changed_at = lockfile_changed_at(context, entry)
+            for (name, version), timestamp in sorted(published.items()):
+                when = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+                base = {"file": entry.relative, "package": f"{name}@{version}", "published": when.isoformat()}
+                age = changed_at - when
+                if age < timedelta(0):
+                    days = -age.total_seconds() / 86400
+                    findings.append({**base, "reason": f"published {days:.1f} days after the lockfile change"})
+                elif age < minimum:
+                    days = age.total_seconds() / 86400
+                    reason = f"published {days:.1f} days before the lockfile change (minimum {check.min_days:g})"
+                    findings.append({**base, "reason": reason})
+                for profile, start in windows:
+                    # Only the margin around the incident counts; later releases are not tied to it.
+                    if start <= when <= start + minimum:
+                        days = (when - start).total_seconds() / 86400
+                        reason = f"published {days:.1f} days after the {profile} incident window start"
+                    elif start - minimum <= when < start:
+                        days = (start - when).total_seconds() / 86400
+                        reason = f"published {days:.1f} days before the {profile} incident window start"
+                    else:
+                        continue
+                    findings.append({**base, "reason": reason})
+    except sqlite3.Error as error:
+        raise ValueError(f"cannot read publish-time store {check.db}: {error}") from error
+    finally:
+        connection.close()
     return findings
 
 
+def import_publish_times_main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="check_js_supply_chain.py import-publish-times",
+        description="Load exported registry metadata (packuments with a `time` map) into a publish-time SQLite store.",
+    )
+    parser.add_argument("db", help="SQLite store to create or update; pass it to --publish-db")
+    parser.add_argument("sources", nargs="+", help="Packument JSON, JSON arrays of packuments, or NDJSON exports")
+    args = parser.parse_args(argv)
+    try:
+        count = import_publish_times(Path(args.db).expanduser(), args.sources)
+    except (OSError, ValueError, sqlite3.Error) as error:
+        print(f"cannot import publish times: {error}", file=sys.stderr)
+        return 2
+    print(f"wrote {args.db}: {count} package versions")
+    return 0
+
+
+LOCK_INTEGRITY_RE = re.compile(r"\bintegrity:\s*['\"]?(sha512-[A-Za-z0-9+/]+=*)")
+
+
+@dataclass
+class InstalledPackage:
+    name: str
+    version: str
+    integrity: str
+    path: str
+    # npm <=6 (lockfileVersion 1) writes _from, _resolved and similar keys into the installed package.json.
+    manifest_rewritten: bool = False
+
+
+def pnpm_lock_integrities(path: str) -> dict[tuple[str, str], str]:
+    integrities: dict[tuple[str, str], str] = {}
+    section = ""
+    slash_versions = False
+    current: tuple[str, str] | None = None
+    with open(path, errors="ignore") as handle:
+        for line in handle:
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            if not line[0].isspace():
+                section = line.split(":", 1)[0].strip()
+                if section == "lockfileVersion":
+                    slash_versions = unquote(line.split(":", 1)[1]).startswith("5")
+                continue
+            if section != "packages":
+                continue
+            match = PNPM_LOCK_KEY_RE.match(line)
+            if match:
+                current = pnpm_package_key(match.group(1), slash_versions)
+                continue
+            integrity = LOCK_INTEGRITY_RE.search(line)
+            if integrity and current:
+                integrities[current] = integrity.group(1)
+    return integrities
+
+
+def pnpm_virtual_store_key(directory: str) -> tuple[str, str] | None:
+    # Entries are named <name with / as +>@<version>, plus peers after "(" (v9) or after "_" in the version (older
+    # layouts). Names may contain "_" themselves (string_decoder) but "@" only as the scope prefix, so the version
+    # starts at the first "@" past it.
+    head = directory.split("(", 1)[0]
+    at = head.find("@", 1)
+    version = head[at + 1 :].split("_", 1)[0] if at > 0 else ""
+    if not version:
+        return None
+    return head[:at].replace("+", "/"), version
+
+
+def pnpm_installed_packages(lockfile: str) -> list[InstalledPackage]:
+    virtual_store = os.path.join(os.path.dirname(lockfile), "node_modules", ".pnpm")
+    directories: dict[tuple[str, str], list[str]] = {}
+    packages: list[InstalledPackage] = []
+    for entry in real_subdirs(virtual_store):
+        if entry.name == "node_modules":  # hoisted links, not a package
+            continue
+        key = pnpm_virtual_store_key(entry.name)
+        if key is None:
+            # Without a name and version there is no integrity to check it against, so it counts as unverified.
+            packages.append(InstalledPackage(entry.name, "", "", entry.path))
+            continue
+        directories.setdefault(key, []).append(entry.name)
+    for (name, version), integrity in pnpm_lock_integrities(lockfile).items():
+        for directory in directories.get((name, version), []):
+            package = os.path.join(virtual_store, directory, "node_modules", name)
+            packages.append(InstalledPackage(name, version, integrity, package))
+    return packages
+
+
+def npm_installed_packages(lockfile: str) -> list[InstalledPackage]:
+    data = load_json(lockfile)
+    base = os.path.dirname(lockfile)
+    packages: list[InstalledPackage] = []
+    if not isinstance(data, dict):
+        return packages
+    if isinstance(data.get("packages"), dict):
+        for location, entry in data["packages"].items():
+            if not isinstance(entry, dict) or "node_modules/" not in location or entry.get("link"):
+                continue
+            integrity, version = entry.get("integrity"), entry.get("version")
+            if isinstance(integrity, str) and isinstance(version, str):
+                name = entry.get("name") or location.rsplit("node_modules/", 1)[1]
+                packages.append(InstalledPackage(name, version, integrity, os.path.join(base, location)))
+        return packages
+    # lockfileVersion 1: dependencies nest the way node_modules does.
+    pending = [(base, data.get("dependencies"))]
+    while pending:
+        parent, dependencies = pending.pop()
+        if not isinstance(dependencies, dict):
+            continue
+        for name, entry in dependencies.items():
+            if not isinstance(entry, dict):
+                continue
+            location = os.path.join(parent, "node_modules", name)
+            integrity, version = entry.get("integrity"), entry.get("version")
+            if isinstance(integrity, str) and isinstance(version, str):
+                packages.append(InstalledPackage(name, version, integrity, location, manifest_rewritten=True))
+            pending.append((location, entry.get("dependencies")))
+    return packages
+
+
+INSTALLED_PACKAGE_SOURCES = {
+    "pnpm-lock.yaml": pnpm_installed_packages,
+    "package-lock.json": npm_installed_packages,
+    "npm-shrinkwrap.json": npm_installed_packages,
+}
+
+
+def sha512_hex(integrity: str) -> str | None:
+    for candidate in integrity.split():
+        algorithm, _, value = candidate.partition("-")
+        if algorithm == "sha512":
+            try:
+                return base64.b64decode(value, validate=True).hex()
+            except ValueError:
+                return None
+    return None
+
+
+def pnpm_store_dir(lockfile: str) -> Path | None:
+    modules = Path(lockfile).with_name("node_modules") / ".modules.yaml"
+    match = re.search(r"(?m)^storeDir:\s*(.+?)\s*$", read_text(modules))
+    return Path(unquote(match.group(1))) if match else None
+
+
+def pnpm_expected_files(store: Path, package: InstalledPackage, digest: str) -> dict[str, str] | None:
+    # Store index files map every file of the tarball to its own integrity (v3) or hex digest (v10).
+    flat = package.name.replace("/", "+")
+    for index in (
+        store / "files" / digest[:2] / f"{digest[2:]}-index.json",
+        store / "index" / digest[:2] / f"{digest[2:64]}-{flat}@{package.version}.json",
+    ):
+        data = load_json(index) if index.is_file() else None
+        if isinstance(data, dict) and isinstance(data.get("files"), dict):
+            expected: dict[str, str] = {}
+            for relative, info in data["files"].items():
+                if not isinstance(info, dict):
+                    continue
+                if isinstance(info.get("integrity"), str):
+                    expected[relative] = sha512_hex(info["integrity"]) or ""
+                elif isinstance(info.get("digest"), str):
+                    expected[relative] = info["digest"]
+            return expected
+    return None
+
+
+def npm_cache_dir() -> Path:
+    return Path(os.environ.get("npm_config_cache") or Path.home() / ".npm")
+
+
+def manifest_digest(data: bytes) -> str | None:
+    # package.json as npm <=6 leaves it: same content, reformatted, plus "_"-prefixed install metadata.
+    try:
+        manifest = json.loads(data)
+    except ValueError:
+        return None
+    if isinstance(manifest, dict):
+        manifest = {key: value for key, value in manifest.items() if not key.startswith("_")}
+    return hashlib.sha512(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+
+
+def npm_expected_files(cache: Path, package: InstalledPackage, digest: str) -> dict[str, str] | None:
+    tarball = cache / "_cacache" / "content-v2" / "sha512" / digest[:2] / digest[2:4] / digest[4:]
+    try:
+        if sha512_file(tarball) != digest:
+            return None  # a corrupt cache entry proves nothing about node_modules
+        expected: dict[str, str] = {}
+        with tarfile.open(tarball, "r:gz") as archive:
+            for member in archive:
+                handle = archive.extractfile(member) if member.isfile() else None
+                if handle is not None:
+                    # npm strips the tarball's top-level directory, whatever it is called.
+                    relative, data = member.name.split("/", 1)[-1], handle.read()
+                    if relative == "package.json" and package.manifest_rewritten:
+                        expected[relative] = manifest_digest(data) or ""
+                    else:
+                        expected[relative] = hashlib.sha512(data).hexdigest()
+        return expected
+    except (OSError, tarfile.TarError):
+        return None
+
+
+def sha512_file(path: str | Path) -> str:
+    digest = hashlib.sha512()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def installed_signature(path: str) -> str | None:
+    # Changes whenever any file below the package (outside nested node_modules) is replaced, edited or touched.
+    signature = hashlib.sha256()
+    pending = [path]
+    found = False
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as it:
+                entries = sorted(it, key=lambda entry: entry.path)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name != "node_modules":
+                    pending.append(entry.path)
+                continue
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            found = True
+            signature.update(f"{entry.path}\0{stat.st_size}\0{stat.st_mtime_ns}\0{stat.st_ino}\n".encode())
+    return signature.hexdigest() if found else None
+
+
+def package_integrity_mismatches(
+    package: InstalledPackage, expected: dict[str, str], root: Path
+) -> list[dict[str, str]]:
+    mismatches: list[dict[str, str]] = []
+    for relative, digest in sorted(expected.items()):
+        installed = os.path.join(package.path, relative)
+        try:
+            if relative == "package.json" and package.manifest_rewritten:
+                actual = manifest_digest(Path(installed).read_bytes())
+            else:
+                actual = sha512_file(installed)
+        except OSError:
+            reason = "missing"
+        else:
+            if actual == digest:
+                continue
+            reason = "content differs from the published package"
+        mismatches.append(
+            {"package": f"{package.name}@{package.version}", "path": os.path.relpath(installed, root), "reason": reason}
+        )
+    return mismatches
+
+
+@dataclass
+class IntegrityStats:
+    verified: int = 0
+    cached: int = 0
+    unverified: int = 0
+
+
+def integrity_findings(
+    root: Path, lockfiles: list[FileEntry], cache: ScanCache | None, stats: IntegrityStats
+) -> Iterator[dict[str, str]]:
+    store_dirs: dict[str, Path | None] = {}
+    npm_cache = npm_cache_dir()
+    work: list[tuple[FileEntry, InstalledPackage, str]] = []
+    for entry in lockfiles:
+        source = INSTALLED_PACKAGE_SOURCES.get(entry.name)
+        if source is None:
+            continue
+        if entry.name == "pnpm-lock.yaml":
+            store_dirs[entry.path] = pnpm_store_dir(entry.path)
+        for package in source(entry.path):
+            if os.path.isdir(package.path):
+                work.append((entry, package, sha512_hex(package.integrity) or ""))
+    if not work:
+        return
+    signatures: list[str | None]
+    with ThreadPoolExecutor(max_workers=WALK_WORKERS) as pool:
+        signatures = list(pool.map(installed_signature, [package.path for _, package, _ in work]))
+        # Packages whose files have not changed since they last verified clean are skipped.
+        keys = [(package.path, package.integrity) for _, package, _ in work]
+        verified = cache.verified_packages(keys) if cache else {}
+
+        def verify(item: tuple[FileEntry, InstalledPackage, str]) -> list[dict[str, str]] | None:
+            entry, package, digest = item
+            if not digest:
+                return None
+            if entry.name == "pnpm-lock.yaml":
+                store = store_dirs.get(entry.path)
+                expected = pnpm_expected_files(store, package, digest) if store else None
+            else:
+                expected = npm_expected_files(npm_cache, package, digest)
+            if expected is None:
+                return None
+            mismatches = package_integrity_mismatches(package, expected, root)
+            return [{"file": entry.relative, **finding} for finding in mismatches]
+
+        pending = [
+            (item, signature)
+            for item, key, signature in zip(work, keys, signatures)
+            if signature is None or verified.get(key) != signature
+        ]
+        stats.cached += len(work) - len(pending)
+        clean: list[tuple[str, str, str]] = []
+        for (item, signature), result in zip(pending, pool.map(verify, [item for item, _ in pending])):
+            if result is None:
+                stats.unverified += 1
+                continue
+            stats.verified += 1
+            if not result and signature is not None:
+                clean.append((item[1].path, item[1].integrity, signature))
+            yield from result
+    if cache:
+        cache.put_verified(clean)
+
+
 def load_ioc_profiles(paths: list[str]) -> list[dict[str, Any]]:
     profiles: list[dict[str, Any]] = []
     for raw in paths:
@@ -448,114 +2164,1309 @@ def load_ioc_profiles(paths: list[str]) -> list[dict[str, Any]]:
     return profiles
 
 
-def profile_version_hits(profile: dict[str, Any], text: str) -> list[str]:
+@dataclass
+class CompiledIocProfile:
+    name: str
+    fingerprints: list[str]
+    package_versions: list[tuple[str, str]]
+    workflow_patterns: list[str]
+    payload_file_names: list[str]
+    persistence_paths: list[str]
+
+
+@dataclass
+class IocMatcher:
+    profiles: list[CompiledIocProfile]
+    literal_pattern: re.Pattern[str] | None
+    prefix_closure: dict[str, tuple[str, ...]]
+    json_keys: dict[str, str]
+    empty_literal: bool
+    file_names: set[str]
+    file_paths: set[str]
+    byte_pattern: re.Pattern[bytes] | None
+    byte_prefix_closure: dict[bytes, tuple[str, ...]]
+    max_literal_bytes: int
+    file_hashes: dict[str, tuple[str, ...]] = field(default_factory=dict)
+
+    @property
+    def has_package_versions(self) -> bool:
+        return any(profile.package_versions for profile in self.profiles)
+
+    def find(self, text: str) -> tuple[set[str], set[tuple[str, str]]]:
+        found: set[str] = {""} if self.empty_literal else set()
+        json_specs: set[tuple[str, str]] = set()
+        if not text or self.literal_pattern is None:
+            return found, json_specs
+        for match in self.literal_pattern.finditer(text):
+            for literal in self.prefix_closure[match.group(1)]:
+                found.add(literal)
+                package = self.json_keys.get(literal)
+                if package is None:
+                    continue
+                spec = JSON_SPEC_VALUE_RE.match(text, match.start() + len(literal))
+                if spec:
+                    json_specs.add((package, spec.group(1)))
+        return found, json_specs
+
+    def find_mapped(self, path: str) -> tuple[set[str], set[tuple[str, str]]]:
+        found: set[str] = {""} if self.empty_literal else set()
+        json_specs: set[tuple[str, str]] = set()
+        if self.byte_pattern is None:
+            return found, json_specs
+        try:
+            with open(path, "rb") as handle:
+                size = os.fstat(handle.fileno()).st_size
+                if not size:
+                    return found, json_specs
+                with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    for start in range(0, size, MMAP_WINDOW_BYTES):
+                        end = min(start + MMAP_WINDOW_BYTES, size)
+                        # Extend each window by the longest literal so a match that
+                        # starts before the boundary is still seen whole.
+                        endpos = min(end + self.max_literal_bytes, size)
+                        for match in self.byte_pattern.finditer(mapped, start, endpos):
+                            if match.start() >= end:
+                                break
+                            for literal in self.byte_prefix_closure[match.group(1)]:
+                                found.add(literal)
+                                package = self.json_keys.get(literal)
+                                if package is None:
+                                    continue
+                                spec = JSON_SPEC_VALUE_BYTES_RE.match(mapped, match.start() + len(literal.encode()))
+                                if spec:
+                                    json_specs.add((package, spec.group(1).decode(errors="ignore")))
+                        release_pages(mapped, start, end - start)
+        except (OSError, ValueError):
+            pass
+        return found, json_specs
+
+
+JSON_SPEC_VALUE_RE = re.compile(r'\s*:\s*"([^"]*)"')
+JSON_SPEC_VALUE_BYTES_RE = re.compile(rb'\s*:\s*"([^"]*)"')
+
+
+def release_pages(mapped: mmap.mmap, start: int, length: int) -> None:
+    # Drop already-searched pages so resident memory stays flat on huge files.
+    if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_DONTNEED"):
+        mapped.madvise(mmap.MADV_DONTNEED, start, length)
+
+
+def string_items(values: Any) -> list[str]:
+    if not isinstance(values, list):
+        return []
+    return [value for value in values if isinstance(value, str)]
+
+
+def profile_package_versions(profile: dict[str, Any]) -> list[tuple[str, str]]:
     versions = profile.get("package_versions", {})
     if not isinstance(versions, dict):
         return []
-    hits: list[str] = []
+    pairs: list[tuple[str, str]] = []
     for package, raw_versions in versions.items():
         if not isinstance(package, str) or not isinstance(raw_versions, list):
             continue
-        for version in raw_versions:
-            if not isinstance(version, str):
-                continue
-            package_pattern = re.escape(package)
-            version_pattern = re.escape(version)
-            patterns = (
-                f"{package}@{version}",
-                f'"{package}": "{package}@{version}"',
-                f"{package}: {version}",
-            )
-            json_spec_match = re.search(rf'"{package_pattern}"\s*:\s*"{version_pattern}"', text)
-            if json_spec_match or any(pattern in text for pattern in patterns):
-                hits.append(f"{package}@{version}")
-    return hits
+        pairs.extend((package, version) for version in raw_versions if isinstance(version, str))
+    return pairs
 
 
-def scan_iocs(root: Path, profiles: list[dict[str, Any]], path: Path, text: str) -> list[dict[str, str]]:
-    hits: list[dict[str, str]] = []
-    relative = rel(root, path)
+def version_literals(package: str, version: str) -> tuple[str, str]:
+    # `"pkg": "pkg@ver"` contains `pkg@ver`, so two literals cover the text forms.
+    return (f"{package}@{version}", f"{package}: {version}")
+
+
+def literal_trie_regex(literals: set[str]) -> str:
+    trie: dict[str, Any] = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict[str, Any]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        if "" not in node:
+            return body
+        return f"(?:{body})?"
+
+    return build(trie)
+
+
+def ioc_matcher_state(profiles: list[dict[str, Any]]) -> dict[str, Any]:
+    compiled: list[CompiledIocProfile] = []
+    literals: set[str] = set()
+    json_keys: dict[str, str] = {}
     for profile in profiles:
-        name = str(profile.get("name", profile.get("_path", "ioc-profile")))
-        for marker in profile.get("fingerprints", []):
-            if isinstance(marker, str) and marker in text:
+        entry = CompiledIocProfile(
+            name=str(profile.get("name", profile.get("_path", "ioc-profile"))),
+            fingerprints=string_items(profile.get("fingerprints", [])),
+            package_versions=profile_package_versions(profile),
+            workflow_patterns=string_items(profile.get("workflow_patterns", [])),
+            payload_file_names=string_items(profile.get("payload_file_names", [])),
+            persistence_paths=string_items(profile.get("persistence_paths", [])),
+        )
+        literals.update(entry.fingerprints)
+        literals.update(entry.workflow_patterns)
+        for package, version in entry.package_versions:
+            literals.update(version_literals(package, version))
+            json_keys[f'"{package}"'] = package
+        literals.update(json_keys)
+        compiled.append(entry)
+    empty_literal = "" in literals
+    literals.discard("")
+    # The trie regex yields the longest literal starting at each offset; every
+    # other literal matching at that offset is one of its prefixes.
+    prefix_closure = {
+        literal: [literal[:size] for size in range(1, len(literal) + 1) if literal[:size] in literals]
+        for literal in sorted(literals)
+    }
+    return {
+        "profiles": [asdict(entry) for entry in compiled],
+        "literals": sorted(literals),
+        "prefix_closure": prefix_closure,
+        "json_keys": json_keys,
+        "empty_literal": empty_literal,
+        "file_names": sorted({name for entry in compiled for name in entry.payload_file_names}),
+        "file_paths": sorted({value for entry in compiled for value in entry.persistence_paths}),
+        "literal_regex": literal_trie_regex(literals),
+        "byte_regex": literal_trie_regex({literal.encode().decode("latin-1") for literal in literals}),
+    }
+
+
+def matcher_from_state(state: dict[str, Any]) -> IocMatcher:
+    compiled = [
+        CompiledIocProfile(**{**entry, "package_versions": [tuple(pair) for pair in entry["package_versions"]]})
+        for entry in state["profiles"]
+    ]
+    literals: list[str] = state["literals"]
+    encoded = {literal.encode(): literal for literal in literals}
+    byte_prefix_closure = {
+        raw: tuple(encoded[raw[:size]] for size in range(1, len(raw) + 1) if raw[:size] in encoded) for raw in encoded
+    }
+    # Fingerprints that are sha256 digests are also matched against file contents, not only text.
+    file_hashes: dict[str, tuple[str, ...]] = {}
+    for entry in compiled:
+        for marker in entry.fingerprints:
+            if SHA256_HEX_RE.fullmatch(marker):
+                file_hashes[marker.lower()] = (*file_hashes.get(marker.lower(), ()), entry.name)
+    literal_pattern = byte_pattern = None
+    if literals:
+        literal_pattern = re.compile(f"(?=({state['literal_regex']}))")
+        byte_pattern = re.compile(b"(?=(" + state["byte_regex"].encode("latin-1") + b"))")
+    return IocMatcher(
+        profiles=compiled,
+        literal_pattern=literal_pattern,
+        prefix_closure={literal: tuple(prefixes) for literal, prefixes in state["prefix_closure"].items()},
+        json_keys=state["json_keys"],
+        empty_literal=state["empty_literal"],
+        file_names=set(state["file_names"]),
+        file_paths=set(state["file_paths"]),
+        byte_pattern=byte_pattern,
+        byte_prefix_closure=byte_prefix_closure,
+        max_literal_bytes=max(map(len, encoded), default=0),
+        file_hashes=file_hashes,
+    )
+
+
+def compile_ioc_profiles(profiles: list[dict[str, Any]]) -> IocMatcher:
+    return matcher_from_state(ioc_matcher_state(profiles))
+
+
+def sha256_file(path: str | Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def index_checksum(index: dict[str, Any]) -> str:
+    body = {key: value for key, value in index.items() if key != "checksum"}
+    return hashlib.sha256(json.dumps(body, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def build_ioc_index(sources: list[str]) -> dict[str, Any]:
+    profiles = load_ioc_profiles(sources)
+    index: dict[str, Any] = {
+        "format": IOC_INDEX_FORMAT,
+        "version": IOC_INDEX_VERSION,
+        "sources": [{"path": profile["_path"], "sha256": sha256_file(profile["_path"])} for profile in profiles],
+        "profiles": profiles,
+        "matcher": ioc_matcher_state(profiles),
+    }
+    index["checksum"] = index_checksum(index)
+    return index
+
+
+def write_ioc_index(index: dict[str, Any], path: Path) -> None:
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(index, sort_keys=True, separators=(",", ":")))
+    os.replace(tmp, path)
+
+
+def refresh_ioc_index(path: Path, index: dict[str, Any]) -> dict[str, Any]:
+    if index.get("checksum") != index_checksum(index):
+        raise ValueError(f"IOC index checksum mismatch: {path}")
+    sources = [source for source in index.get("sources") or [] if isinstance(source, dict)]
+    source_paths = [str(source.get("path")) for source in sources]
+    rebuildable = bool(source_paths) and all(Path(source).is_file() for source in source_paths)
+    stale = index.get("version") != IOC_INDEX_VERSION or (
+        rebuildable and any(sha256_file(source["path"]) != source.get("sha256") for source in sources)
+    )
+    if not stale:
+        return index
+    if not rebuildable:
+        raise ValueError(f"IOC index is outdated and its source profiles are missing: {path}")
+    rebuilt = build_ioc_index(source_paths)
+    try:
+        write_ioc_index(rebuilt, path)
+    except OSError as error:
+        print(f"warning: could not rewrite IOC index {path}: {error}", file=sys.stderr)
+    return rebuilt
+
+
+def load_ioc_inputs(paths: list[str]) -> tuple[list[dict[str, Any]], IocMatcher | None]:
+    profiles: list[dict[str, Any]] = []
+    indexes: list[dict[str, Any]] = []
+    for raw in paths:
+        path = Path(raw).expanduser().resolve()
+        data = load_json(path)
+        if isinstance(data, dict) and data.get("format") == IOC_INDEX_FORMAT:
+            index = refresh_ioc_index(path, data)
+            indexes.append(index)
+            profiles.extend(index["profiles"])
+        else:
+            profiles.extend(load_ioc_profiles([str(path)]))
+    # A single compiled index carries ready matcher state; anything mixed is recompiled.
+    if len(paths) == 1 and indexes:
+        return profiles, matcher_from_state(indexes[0]["matcher"])
+    return profiles, None
+
+
+def compile_ioc_main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="check_js_supply_chain.py compile-ioc",
+        description="Compile IOC profile JSON into a versioned, checksummed index usable with --ioc.",
+    )
+    parser.add_argument("profiles", nargs="+", help="IOC profile JSON files")
+    parser.add_argument("-o", "--output", help="Index path (default: <first profile>.index.json)")
+    args = parser.parse_args(argv)
+    try:
+        index = build_ioc_index(args.profiles)
+    except (OSError, ValueError) as error:
+        print(str(error), file=sys.stderr)
+        return 2
+    output = Path(args.output) if args.output else Path(args.profiles[0]).with_suffix(".index.json")
+    write_ioc_index(index, output)
+    print(f"wrote {output}: {len(index['profiles'])} profiles, {len(index['matcher']['literals'])} indicators")
+    return 0
+
+
+def scan_iocs(
+    matcher: IocMatcher, relative: str, text: str, resolved: ResolvedIndex | None = None
+) -> list[dict[str, Any]]:
+    if not matcher.profiles:
+        return []
+    return ioc_hits_from_matches(matcher, relative, *matcher.find(text), resolved)
+
+
+def has_package_version(
+    package: str, version: str, found: set[str], json_specs: set[tuple[str, str]], resolved: ResolvedIndex | None
+) -> bool:
+    # Parsed lockfiles answer from resolved versions; other files fall back to text forms.
+    if resolved:
+        return version in resolved.get(package, {})
+    return (package, version) in json_specs or any(token in found for token in version_literals(package, version))
+
+
+def ioc_hits_from_matches(
+    matcher: IocMatcher,
+    relative: str,
+    found: set[str],
+    json_specs: set[tuple[str, str]],
+    resolved: ResolvedIndex | None = None,
+) -> list[dict[str, Any]]:
+    hits: list[dict[str, Any]] = []
+    filename = os.path.basename(relative)
+    check_files = filename in matcher.file_names or relative in matcher.file_paths
+    if not found and not check_files and not resolved:
+        return hits
+    for profile in matcher.profiles:
+        name = profile.name
+        for marker in profile.fingerprints:
+            if marker in found:
                 hits.append({"profile": name, "file": relative, "type": "fingerprint", "value": marker})
-        for token in profile_version_hits(profile, text):
-            hits.append({"profile": name, "file": relative, "type": "package-version", "value": token})
-        for pattern in profile.get("workflow_patterns", []):
-            if isinstance(pattern, str) and pattern in text:
+        for package, version in profile.package_versions:
+            if has_package_version(package, version, found, json_specs, resolved):
+                token = f"{package}@{version}"
+                hits.append({"profile": name, "file": relative, "type": "package-version", "value": token})
+        for pattern in profile.workflow_patterns:
+            if pattern in found:
                 hits.append({"profile": name, "file": relative, "type": "workflow-pattern", "value": pattern})
-        for filename in profile.get("payload_file_names", []):
-            if isinstance(filename, str) and path.name == filename:
-                hits.append({"profile": name, "file": relative, "type": "payload-file", "value": filename})
-        for persistence in profile.get("persistence_paths", []):
-            if isinstance(persistence, str) and relative == persistence:
+        if not check_files:
+            continue
+        for payload in profile.payload_file_names:
+            if filename == payload:
+                hits.append({"profile": name, "file": relative, "type": "payload-file", "value": payload})
+        for persistence in profile.persistence_paths:
+            if relative == persistence:
                 hits.append({"profile": name, "file": relative, "type": "persistence-path", "value": persistence})
     return hits
 
 
-def scan(root: Path, since: datetime | None, ioc_profiles: list[dict[str, Any]], include_installed: bool) -> dict[str, Any]:
-    package_files: list[Path] = []
-    recent_package_files: list[dict[str, str]] = []
-    risky_specs: list[dict[str, str]] = []
-    package_lifecycle_scripts: list[dict[str, str]] = []
-    ci_findings: list[dict[str, str]] = []
-    ioc_hits: list[dict[str, str]] = []
+def root_key(root: Path) -> str:
+    return hashlib.sha256(str(root).encode()).hexdigest()[:16]
 
-    for path in walk_files(root):
-        text = ""
-        if path.name in PACKAGE_MANAGER_FILES or path.name in CONFIG_FILES or path.suffix in CI_FILES:
-            text = read_text(path)
-            ioc_hits.extend(scan_iocs(root, ioc_profiles, path, text))
+
+def profile_digest(profiles: list[dict[str, Any]]) -> str:
+    # Cached results come from the parsers and decoders too, so any change to this script invalidates them,
+    # even one that forgets to bump CACHE_VERSION.
+    try:
+        source = sha256_file(__file__)
+    except OSError:
+        source = ""
+    payload = json.dumps([CACHE_VERSION, source, profiles], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def stat_key(stat: os.stat_result) -> list[int]:
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+def entry_key(entry: FileEntry) -> list[Any]:
+    key: list[Any] = stat_key(entry.stat())
+    if LOCKFILE_GRAPHS.get(entry.name) in MANIFEST_GRAPHS:
+        try:
+            key.append(stat_key(os.stat(os.path.join(os.path.dirname(entry.path), "package.json"))))
+        except OSError:
+            key.append(None)
+    return key
+
+
+@dataclass
+class ScanCache:
+    path: Path | None
+    digest: str
+    entries: dict[str, Any]
+    seen: dict[str, Any] = field(default_factory=dict)
+    hits: int = 0
+    misses: int = 0
+    digests: dict[tuple[int, int], tuple[int, int, str]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, cache_dir: Path, root: Path, digest: str) -> ScanCache:
+        path = cache_dir / f"{root_key(root)}.json"
+        data = load_json(path) if path.is_file() else None
+        entries: dict[str, Any] = {}
+        if isinstance(data, dict) and data.get("digest") == digest and isinstance(data.get("files"), dict):
+            entries = data["files"]
+        return cls(path, digest, entries)
+
+    def get(self, entry: FileEntry) -> dict[str, list[dict[str, str]]] | None:
+        cached = self.entries.get(entry.relative)
+        try:
+            key = entry_key(entry)
+        except OSError:
+            return None
+        if isinstance(cached, dict) and cached.get("stat") == key and isinstance(cached.get("results"), dict):
+            self.hits += 1
+            self.seen[entry.relative] = cached
+            return cached["results"]
+        self.misses += 1
+        return None
+
+    def put(self, entry: FileEntry, results: dict[str, list[dict[str, str]]]) -> None:
+        try:
+            self.seen[entry.relative] = {"stat": entry_key(entry), "results": results}
+        except OSError:
+            pass
+
+    def save(self, prune: bool = True) -> None:
+        files = self.seen if prune else {**self.entries, **self.seen}
+        # Keep the saved state warm so a long-lived process (--watch) can reuse this cache.
+        self.entries, self.seen = files, {}
+        if self.path is None:
+            return
+        payload = json.dumps({"digest": self.digest, "files": files}, separators=(",", ":"))
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(payload)
+            os.replace(tmp, self.path)
+        except OSError as error:
+            print(f"warning: could not write scan cache {self.path}: {error}", file=sys.stderr)
+
+    def stats(self) -> dict[str, Any]:
+        return {"path": str(self.path) if self.path else None, "hits": self.hits, "misses": self.misses}
+
+    @property
+    def hash_db(self) -> Path | None:
+        # Shared by every root: digests are keyed by inode, so checkouts linking the same files reuse them.
+        return self.path.with_name("file-hashes.sqlite") if self.path else None
+
+    def file_digests(self, inodes: list[tuple[int, int]]) -> dict[tuple[int, int], tuple[int, int, str]]:
+        missing = [inode for inode in inodes if inode not in self.digests]
+        if missing and self.hash_db and self.hash_db.is_file():
+            try:
+                connection = sqlite3.connect(self.hash_db, timeout=30)
+                try:
+                    self.digests.update(file_hashes_lookup(connection, missing))
+                finally:
+                    connection.close()
+            except sqlite3.Error as error:
+                print(f"warning: could not read file hash cache {self.hash_db}: {error}", file=sys.stderr)
+        return {inode: self.digests[inode] for inode in inodes if inode in self.digests}
+
+    def put_digests(self, rows: list[tuple[int, int, int, int, str]]) -> None:
+        self.digests.update(((dev, ino), (size, mtime_ns, sha256)) for dev, ino, size, mtime_ns, sha256 in rows)
+        if not rows or self.hash_db is None:
+            return
+        try:
+            self.hash_db.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.hash_db, timeout=30)
+            try:
+                with connection:
+                    connection.execute(FILE_HASHES_SCHEMA)
+                    connection.executemany("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?, ?)", rows)
+            finally:
+                connection.close()
+        except (OSError, sqlite3.Error) as error:
+            print(f"warning: could not write file hash cache {self.hash_db}: {error}", file=sys.stderr)
+
+    def verified_packages(self, keys: list[tuple[str, str]]) -> dict[tuple[str, str], str]:
+        if not keys or self.hash_db is None or not self.hash_db.is_file():
+            return {}
+        try:
+            connection = sqlite3.connect(self.hash_db, timeout=30)
+            try:
+                connection.execute(VERIFIED_PACKAGES_SCHEMA)
+                return verified_packages_lookup(connection, keys)
+            finally:
+                connection.close()
+        except sqlite3.Error as error:
+            print(f"warning: could not read file hash cache {self.hash_db}: {error}", file=sys.stderr)
+            return {}
+
+    def put_verified(self, rows: list[tuple[str, str, str]]) -> None:
+        if not rows or self.hash_db is None:
+            return
+        try:
+            self.hash_db.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.hash_db, timeout=30)
+            try:
+                with connection:
+                    connection.execute(VERIFIED_PACKAGES_SCHEMA)
+                    connection.executemany("INSERT OR REPLACE INTO verified_packages VALUES (?, ?, ?)", rows)
+            finally:
+                connection.close()
+        except (OSError, sqlite3.Error) as error:
+            print(f"warning: could not write file hash cache {self.hash_db}: {error}", file=sys.stderr)
+
+
+def file_hashes_lookup(
+    connection: sqlite3.Connection, inodes: list[tuple[int, int]]
+) -> dict[tuple[int, int], tuple[int, int, str]]:
+    connection.execute("CREATE TEMP TABLE IF NOT EXISTS wanted_inodes (dev INTEGER NOT NULL, ino INTEGER NOT NULL)")
+    found: dict[tuple[int, int], tuple[int, int, str]] = {}
+    for start in range(0, len(inodes), SQLITE_LOOKUP_BATCH):
+        connection.execute("DELETE FROM wanted_inodes")
+        connection.executemany("INSERT INTO wanted_inodes VALUES (?, ?)", inodes[start : start + SQLITE_LOOKUP_BATCH])
+        rows = connection.execute(
+            "SELECT h.dev, h.ino, h.size, h.mtime_ns, h.sha256 FROM wanted_inodes w JOIN file_hashes h USING (dev, ino)"
+        )
+        found.update(((dev, ino), (size, mtime_ns, sha256)) for dev, ino, size, mtime_ns, sha256 in rows)
+    return found
+
+
+def verified_packages_lookup(
+    connection: sqlite3.Connection, keys: list[tuple[str, str]]
+) -> dict[tuple[str, str], str]:
+    connection.execute("CREATE TEMP TABLE IF NOT EXISTS wanted_packages (path TEXT NOT NULL, integrity TEXT NOT NULL)")
+    found: dict[tuple[str, str], str] = {}
+    for start in range(0, len(keys), SQLITE_LOOKUP_BATCH):
+        connection.execute("DELETE FROM wanted_packages")
+        connection.executemany("INSERT INTO wanted_packages VALUES (?, ?)", keys[start : start + SQLITE_LOOKUP_BATCH])
+        rows = connection.execute(
+            "SELECT v.path, v.integrity, v.signature "
+            "FROM wanted_packages w JOIN verified_packages v USING (path, integrity)"
+        )
+        found.update(((path, integrity), signature) for path, integrity, signature in rows)
+    return found
+
+
+def hash_candidate(matcher: IocMatcher, relative: str, name: str) -> bool:
+    if name in matcher.file_names or relative in matcher.file_paths:
+        return True
+    return os.path.splitext(name)[1] in HASH_SUFFIXES and not HASH_DIRS.isdisjoint(relative.split(os.sep))
+
+
+def installed_hash_candidates(
+    root: Path, matcher: IocMatcher, node_modules: list[str] | None = None
+) -> Iterator[tuple[str, str]]:
+    # Every real file under node_modules, without following pnpm's symlinks or skipping dist/build.
+    for directory in node_modules_dirs(root) if node_modules is None else node_modules:
+        pending = [directory]
+        while pending:
+            try:
+                with os.scandir(pending.pop()) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif os.path.splitext(entry.name)[1] in HASH_SUFFIXES or entry.name in matcher.file_names:
+                    if entry.is_file(follow_symlinks=False):
+                        yield os.path.relpath(entry.path, root), entry.path
+
+
+def sha256_or_none(path: str) -> str | None:
+    try:
+        return sha256_file(path)
+    except OSError:
+        return None
+
+
+def file_hash_hits(
+    matcher: IocMatcher,
+    candidates: list[tuple[str, str]],
+    cache: ScanCache | None = None,
+    instrumentation: Instrumentation | None = None,
+) -> list[dict[str, str]]:
+    files: list[tuple[str, str, os.stat_result]] = []
+    for relative, path in candidates:
+        try:
+            files.append((relative, path, os.stat(path)))
+        except OSError:
+            continue
+    # Digests are reused while an inode keeps its size and mtime, so an unchanged machine hashes nothing.
+    known = cache.file_digests([(stat.st_dev, stat.st_ino) for _, _, stat in files]) if cache else {}
+    digests: dict[tuple[int, int], str] = {}
+    pending: dict[tuple[int, int], tuple[str, os.stat_result]] = {}
+    for _, path, stat in files:
+        inode = (stat.st_dev, stat.st_ino)
+        cached = known.get(inode)
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            digests[inode] = cached[2]
         else:
-            ioc_hits.extend(scan_iocs(root, ioc_profiles, path, ""))
-        if path.name in PACKAGE_MANAGER_FILES:
-            package_files.append(path)
-            if path.name == "package.json":
-                data = load_json(path)
-                risky_specs.extend(package_json_risks(root, path, data))
-                package_lifecycle_scripts.extend(package_json_script_risks(root, path, data))
-            if since and file_mtime(path) >= since:
-                recent_package_files.append({"file": rel(root, path), "mtime": file_mtime(path).isoformat()})
-        if text:
-            ci_findings.extend(ci_install_findings(root, path, text))
-
-    installed_lifecycle_scripts = installed_package_findings(root) if include_installed else []
+            pending.setdefault(inode, (path, stat))
+    if pending:
+        with ThreadPoolExecutor(max_workers=WALK_WORKERS) as pool:
+            hashed = list(pool.map(sha256_or_none, [path for path, _ in pending.values()]))
+        rows = []
+        for (inode, (_, stat)), digest in zip(pending.items(), hashed):
+            if digest is not None:
+                digests[inode] = digest
+                rows.append((*inode, stat.st_size, stat.st_mtime_ns, digest))
+        if cache:
+            cache.put_digests(rows)
+        if instrumentation:
+            instrumentation.count("files_hashed", len(rows))
+            instrumentation.count("bytes_read", sum(stat.st_size for _, stat in pending.values()))
+    hits: list[dict[str, str]] = []
+    for relative, _, stat in files:
+        digest = digests.get((stat.st_dev, stat.st_ino), "")
+        for profile in matcher.file_hashes.get(digest, ()):
+            hits.append({"profile": profile, "file": relative, "type": "file-sha256", "value": digest})
+    return hits
+
+
+@dataclass
+class FindingStore:
+    """Report findings as tuples over shared key shapes and interned strings.
+
+    Past ``budget`` estimated bytes every section moves to an anonymous temp
+    file of JSON lines, and later findings are appended there directly.
+    """
+
+    budget: int = FINDINGS_MEMORY_BUDGET
+    shapes: dict[tuple[str, ...], int] = field(default_factory=dict)
+    keys: list[tuple[str, ...]] = field(default_factory=list)
+    strings: dict[str, str] = field(default_factory=dict)
+    records: dict[str, list[tuple[Any, ...]]] = field(default_factory=dict)
+    counts: dict[str, int] = field(default_factory=dict)
+    spills: dict[str, IO[bytes]] = field(default_factory=dict)
+    size: int = 0
+    spilled: bool = False
+
+    def append(self, section: str, value: Any) -> None:
+        self.counts[section] = self.counts.get(section, 0) + 1
+        if isinstance(value, dict):
+            keys = tuple(value)
+            shape = self.shapes.get(keys)
+            if shape is None:
+                shape = self.shapes[keys] = len(self.keys)
+                self.keys.append(keys)
+            values: Iterable[Any] = value.values()
+        else:
+            shape, values = -1, (value,)
+        if self.spilled:
+            self.write(section, [(shape, *values)])
+            return
+        record = [shape]
+        strings = self.strings
+        for item in values:
+            if isinstance(item, str):
+                shared = strings.get(item)
+                if shared is None:
+                    strings[item] = shared = item
+                    self.size += sys.getsizeof(item)
+                item = shared
+            record.append(item)
+        self.records.setdefault(section, []).append(tuple(record))
+        self.size += 40 + 8 * len(record)  # tuple header plus one pointer per field
+        if self.size > self.budget:
+            self.spill()
+
+    def write(self, section: str, records: list[tuple[Any, ...]]) -> None:
+        spill = self.spills.get(section)
+        if spill is None:
+            spill = self.spills[section] = tempfile.TemporaryFile(prefix="package-security-check-")
+        spill.writelines(json.dumps(record).encode() + b"\n" for record in records)
+
+    def spill(self) -> None:
+        for section, records in self.records.items():
+            self.write(section, records)
+        self.records.clear()
+        self.strings.clear()
+        self.size = 0
+        self.spilled = True
+
+    def expand(self, record: Any) -> Any:
+        if record[0] < 0:
+            return record[1]
+        return dict(zip(self.keys[record[0]], record[1:]))
+
+    def iter(self, section: str) -> Iterator[Any]:
+        spill = self.spills.get(section)
+        if spill is not None:
+            # pread leaves the append position alone, so findings can still be added while reading.
+            spill.flush()
+            offset, pending = 0, b""
+            while chunk := os.pread(spill.fileno(), SPILL_READ_BYTES, offset):
+                offset += len(chunk)
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    yield self.expand(json.loads(line))
+        for record in self.records.get(section, ()):
+            yield self.expand(record)
+
+
+@dataclass
+class Findings:
+    """Read-only view of one report section in a FindingStore."""
+
+    store: FindingStore = field(repr=False)
+    section: str
+
+    def __len__(self) -> int:
+        return self.store.counts.get(self.section, 0)
+
+    def __iter__(self) -> Iterator[Any]:
+        return self.store.iter(self.section)
+
+
+def is_streamed(entry: FileEntry) -> bool:
+    if entry.name not in LOCKFILES:
+        return False
+    try:
+        return entry.stat().st_size >= STREAM_THRESHOLD_BYTES
+    except OSError:
+        return False
+
+
+def walk_order_key(relative: str) -> list[tuple[int, str]]:
+    # Matches walk_files: sorted names, files before subdirectories.
+    parts = relative.split(os.sep)
+    return [(1, part) for part in parts[:-1]] + [(0, parts[-1])]
 
+
+def git_paths(context: ScanContext, args: list[str]) -> list[str]:
+    result = context.run(["git", *args])
+    if not result or result.returncode != 0:
+        raise ValueError(f"git {' '.join(args)} failed in {context.root}")
+    return [path for path in result.stdout.split("\0") if path]
+
+
+def git_file_entries(root: Path, paths: set[str]) -> list[FileEntry]:
+    entries: list[FileEntry] = []
+    for raw in sorted(paths, key=lambda value: walk_order_key(os.path.normpath(value))):
+        relative = os.path.normpath(raw)
+        parts = relative.split(os.sep)
+        if any(should_skip_dir(part, False) for part in parts[:-1]):
+            continue
+        path = os.path.join(root, relative)
+        if os.path.isfile(path):
+            entries.append(FileEntry(parts[-1], relative, path))
+    return entries
+
+
+def changed_entries(context: ScanContext, ref: str) -> list[FileEntry]:
+    changed = set(git_paths(context, ["diff", "--name-only", "-z", "--relative", ref, "--"]))
+    changed.update(git_paths(context, ["ls-files", "-z", "--others", "--exclude-standard"]))
+    return git_file_entries(context.root, changed)
+
+
+def git_config_texts(context: ScanContext) -> dict[str, str]:
+    pathspecs = [f":(glob)**/{name}" for name in sorted(CONFIG_FILES)]
+    paths = git_paths(context, ["ls-files", "-z", "--cached", "--others", "--exclude-standard", "--", *pathspecs])
+    return {entry.name: read_text(entry.path) for entry in git_file_entries(context.root, set(paths))}
+
+
+def file_ioc_matches(
+    matcher: IocMatcher,
+    entry: FileEntry,
+    text: str | None,
+    instrumentation: Instrumentation | None = None,
+    shared: SharedFiles | None = None,
+) -> tuple[set[str], set[tuple[str, str]], ResolvedIndex | None]:
+    # Hardlinked copies (for example checkouts made with `cp -al`) share one match; hits stay per path.
+    key = None
+    if shared is not None:
+        try:
+            stat = entry.stat()
+        except OSError:
+            stat = None
+        key = inode_key(stat) if stat and stat.st_nlink > 1 else None
+        cached = shared.match(key) if key else None
+        if cached is not None and cached[0] is matcher:
+            if instrumentation:
+                instrumentation.count("shared_file_hits")
+            return cached[1:]
+    resolved = None
+    if matcher.has_package_versions:
+        with timed(instrumentation, "lockfile_resolution"):
+            resolved = resolved_packages(entry)
+        if instrumentation and entry.name in LOCKFILE_PARSERS:
+            instrumentation.count("lockfile_parses")
+    if instrumentation:
+        instrumentation.count("regex_evaluations")
+    with timed(instrumentation, "ioc_matching"):
+        found, json_specs = matcher.find(text) if text is not None else matcher.find_mapped(entry.path)
+    if shared is not None and key:
+        shared.remember_match(key, (matcher, found, json_specs, resolved))
+    return found, json_specs, resolved
+
+
+def analyze_file(
+    root: Path,
+    matcher: IocMatcher,
+    entry: FileEntry,
+    text: str | None,
+    instrumentation: Instrumentation | None = None,
+    shared: SharedFiles | None = None,
+) -> dict[str, list[dict[str, Any]]]:
+    path = Path(entry.path)
+    results: dict[str, list[dict[str, Any]]] = {key: [] for key in FILE_RESULT_KEYS}
+    resolved = None
+    if matcher.profiles:
+        found, json_specs, resolved = file_ioc_matches(matcher, entry, text, instrumentation, shared)
+        with timed(instrumentation, "ioc_matching"):
+            results["ioc_hits"] = ioc_hits_from_matches(matcher, entry.relative, found, json_specs, resolved)
+    if resolved:
+        with timed(instrumentation, "dependency_graph"):
+            annotate_introducers(entry, results["ioc_hits"])
+    if text is None:
+        return results
+    if entry.name == "package.json":
+        with timed(instrumentation, "manifest_checks"):
+            data = load_json(entry.path)
+            results["risky_direct_specs"] = package_json_risks(root, path, data)
+            results["package_lifecycle_scripts"] = package_json_script_risks(root, path, data)
+        if instrumentation:
+            instrumentation.count("json_parses")
+    if text:
+        with timed(instrumentation, "workflow_checks"):
+            results["ci_install_findings"] = ci_install_findings(root, path, text, instrumentation)
+    return results
+
+
+def scan(
+    root: Path,
+    since: datetime | None,
+    ioc_profiles: list[dict[str, Any]],
+    include_installed: bool,
+    *,
+    cache: ScanCache | None = None,
+    matcher: IocMatcher | None = None,
+    changed_since: str | None = None,
+    emit: Callable[[str, Any], None] | None = None,
+    fail_fast: threading.Event | None = None,
+    instrumentation: Instrumentation | None = None,
+    context: ScanContext | None = None,
+    release_age: ReleaseAgeCheck | None = None,
+    findings_budget: int = FINDINGS_MEMORY_BUDGET,
+    shared: SharedFiles | None = None,
+    verify_integrity: bool = False,
+    probe_budget: float = PROBE_BUDGET_SECONDS,
+    paths: list[str] | None = None,
+    stream_findings: bool = False,
+) -> dict[str, Any]:
+    # Sections are plain lists unless the caller streams them (the CLI writers): then they are Findings views
+    # over a store that spills to disk past findings_budget.
+    package_files = 0
+    lockfiles: list[FileEntry] = []
+    hash_files: list[tuple[str, str]] = []
+    recent: list[dict[str, str]] = []
+    store = FindingStore(findings_budget)
+    matcher = matcher or compile_ioc_profiles(ioc_profiles)
+    config_texts: dict[str, str] = {}
+    # A caller-owned context keeps its probed policy across scans; config texts are always re-read.
+    context = context or ScanContext(root, probe_budget=probe_budget)
+    shared = shared or SharedFiles()
+    context.config_texts = config_texts
+    context.instrumentation = instrumentation
+    spawned = context.subprocess_count
+    integrity = IntegrityStats() if verify_integrity else None
+
+    def record(section: str, values: Iterable[Any]) -> None:
+        found = False
+        for value in values:
+            found = True
+            store.append(section, value)
+            if emit:
+                emit(section, value)
+        if section in FAIL_FAST_SECTIONS and found and fail_fast is not None:
+            fail_fast.set()
+
+    # The full walk collects node_modules directories for the installed-package phases; scoped scans leave
+    # this None and those phases find them on their own.
+    node_modules: list[str] | None = [] if include_installed else None
+    entries: Iterable[FileEntry] = walk_files(root, node_modules=node_modules)
+    changed: list[FileEntry] | None = None
+    if changed_since is not None:
+        # Only changed files are analyzed; repo-level config comes from git's file list.
+        with timed(instrumentation, "changed_files"):
+            entries = changed = changed_entries(context, changed_since)
+            node_modules = None
+            config_texts.update(git_config_texts(context))
+    elif paths is not None:
+        # Caller-chosen files; repo-level config is what pnpm itself reads, at the root.
+        entries = changed = git_file_entries(root, {os.path.relpath(os.path.join(root, path), root) for path in paths})
+        node_modules = None
+        config_texts.update({name: read_text(root / name) for name in CONFIG_FILES if (root / name).is_file()})
+    walked = None
+    if instrumentation:
+        entries = walked = timed_iter(entries, instrumentation, "walk")
+
+    aborted = False
+    for entry in entries:
+        if fail_fast is not None and fail_fast.is_set():
+            aborted = True
+            break
+        name = entry.name
+        if instrumentation:
+            instrumentation.count("files_visited")
+        if matcher.file_hashes and hash_candidate(matcher, entry.relative, name):
+            hash_files.append((entry.relative, entry.path))
+        if not (name in PACKAGE_MANAGER_FILES or name in CONFIG_FILES or entry.suffix in CI_FILES):
+            record("ioc_hits", scan_iocs(matcher, entry.relative, ""))
+            continue
+        results = cache.get(entry) if cache else None
+        text: str | None = None
+        if name in CONFIG_FILES or (results is None and not is_streamed(entry)):
+            with timed(instrumentation, "read"):
+                text = read_text(entry.path)
+            if name in CONFIG_FILES and changed is None:
+                config_texts[name] = text
+        if results is None:
+            started = time.perf_counter()
+            results = analyze_file(root, matcher, entry, text, instrumentation, shared)
+            if instrumentation:
+                instrumentation.count("files_analyzed")
+                instrumentation.count("bytes_read", entry.stat().st_size)
+                instrumentation.file(entry.relative, time.perf_counter() - started)
+            if cache:
+                cache.put(entry, results)
+        for key in FILE_RESULT_KEYS:
+            record(key, results[key])
+        if name in PACKAGE_MANAGER_FILES:
+            package_files += 1
+            if name in LOCKFILE_PARSERS:
+                lockfiles.append(entry)
+            if since and file_mtime(entry.stat()) >= since:
+                recent.append({"file": entry.relative, "mtime": file_mtime(entry.stat()).isoformat()})
+                if emit:
+                    emit("recent_package_manager_files", recent[-1])
+    if walked is not None:
+        walked.close()
+
+    policy = None
+    if not aborted:
+        # A fail-fast stop skips the remaining slow phases: responders only need the hit.
+        if matcher.file_hashes:
+            with timed(instrumentation, "file_hashes"):
+                if include_installed:
+                    hash_files.extend(installed_hash_candidates(root, matcher, node_modules))
+                record("ioc_hits", file_hash_hits(matcher, hash_files, cache, instrumentation))
+        if integrity:
+            with timed(instrumentation, "integrity"):
+                record("integrity_mismatches", integrity_findings(root, lockfiles, cache, integrity))
+        if include_installed:
+            with timed(instrumentation, "installed"):
+                installed = installed_package_findings(root, instrumentation, shared, node_modules)
+                record("installed_lifecycle_scripts", installed)
+        if release_age:
+            with timed(instrumentation, "release_age"):
+                record("release_age_findings", release_age_findings(context, lockfiles, release_age, ioc_profiles))
+        with timed(instrumentation, "repo_config"):
+            record("repo_config_findings", repo_config_findings(context))
+        with timed(instrumentation, "effective_config"):
+            record("effective_config_findings", effective_config_findings(context))
+        policy = context.policy
+        if cache:
+            cache.save(prune=changed is None)
+
+    for found in sorted(recent, key=lambda x: x["mtime"]):
+        store.append("recent_package_manager_files", found)
     return {
         "root": str(root),
-        "package_manager_policy": package_manager_policy(root),
-        "package_manager_files_scanned": len(package_files),
-        "risky_direct_specs": risky_specs,
-        "package_lifecycle_scripts": package_lifecycle_scripts,
-        "installed_lifecycle_scripts": installed_lifecycle_scripts,
-        "ci_install_findings": ci_findings,
-        "recent_package_manager_files": sorted(recent_package_files, key=lambda x: x["mtime"]),
+        "package_manager_policy": policy,
+        "package_manager_files_scanned": package_files,
+        **{key: Findings(store, key) if stream_findings else list(store.iter(key)) for key in REPORT_FINDING_KEYS},
         "ioc_profiles": [p.get("name", p.get("_path")) for p in ioc_profiles],
-        "ioc_hits": ioc_hits,
-        "repo_config_findings": repo_config_findings(root),
-        "effective_config_findings": effective_config_findings(root),
+        "subprocess_count": context.subprocess_count - spawned,
+        "cache": cache.stats() if cache else None,
+        "integrity": asdict(integrity) if integrity else None,
+        "changed_since": changed_since,
+        "changed_files": None if changed is None else len(changed),
+        "aborted": aborted,
+        "instrumentation": instrumentation.report() if instrumentation else None,
     }
 
 
+def report_summary(report: dict[str, Any]) -> dict[str, Any]:
+    summary = {key: value for key, value in report.items() if key not in REPORT_FINDING_KEYS}
+    summary["counts"] = {key: len(report[key]) for key in REPORT_FINDING_KEYS}
+    return summary
+
+
+def json_leaf(value: Any, indent: int | None, depth: int) -> str:
+    text = json.dumps(value, indent=indent, sort_keys=True)
+    return text if indent is None else text.replace("\n", "\n" + " " * (indent * depth))
+
+
+def iter_json(value: Any, indent: int | None = 2, depth: int = 0) -> Iterator[str]:
+    # Same text as json.dumps(value, indent=indent, sort_keys=True), with Findings streamed from their store.
+    if isinstance(value, Findings):
+        yield from iter_json_findings(value, indent, depth)
+        return
+    if isinstance(value, dict):
+        items: Iterable[tuple[str, Any]] = ((json.dumps(key) + ": ", value[key]) for key in sorted(value))
+        opener, closer = "{", "}"
+    elif isinstance(value, list):
+        items = (("", item) for item in value)
+        opener, closer = "[", "]"
+    else:
+        yield json_leaf(value, indent, depth)
+        return
+    inner = "" if indent is None else "\n" + " " * (indent * (depth + 1))
+    separator = ", " if indent is None else ","
+    first = True
+    for prefix, item in items:
+        yield (opener if first else separator) + inner + prefix
+        first = False
+        yield from iter_json(item, indent, depth + 1)
+    if first:
+        yield opener + closer
+    else:
+        yield ("" if indent is None else "\n" + " " * (indent * depth)) + closer
+
+
+def iter_json_findings(findings: Findings, indent: int | None, depth: int) -> Iterator[str]:
+    # One encode per batch keeps the per-call encoder setup off the per-finding path.
+    encoder = json.JSONEncoder(indent=indent, sort_keys=True)
+    pad = "" if indent is None else "\n" + " " * (indent * depth)
+    findings_iter = iter(findings)
+    opener = "["
+    while batch := list(islice(findings_iter, 1000)):
+        body = encoder.encode(batch)[1:-1]
+        yield opener + (body if indent is None else body[:-1].replace("\n", pad))
+        opener = ", " if indent is None else ","
+    yield "[]" if opener == "[" else pad + "]"
+
+
+def print_json(value: Any) -> None:
+    sys.stdout.writelines(iter_json(value))
+    sys.stdout.write("\n")
+
+
+def ndjson_emitter(lock: threading.Lock) -> Callable[[Path], Callable[[str, Any], None]]:
+    def for_root(root: Path) -> Callable[[str, Any], None]:
+        def emit(section: str, finding: Any) -> None:
+            if section == "summary":
+                record = {"type": "summary", **finding}
+            else:
+                record = {"type": "finding", "root": str(root), "section": section, "finding": finding}
+            line = json.dumps(record, sort_keys=True)
+            with lock:
+                print(line, flush=True)
+
+        return emit
+
+    return for_root
+
+
+def has_tampering(report: dict[str, Any]) -> bool:
+    return any(report[key] for key in FAIL_FAST_SECTIONS)
+
+
+def has_hardening_gap(report: dict[str, Any]) -> bool:
+    return bool(
+        report["risky_direct_specs"]
+        or report["package_lifecycle_scripts"]
+        or report["ci_install_findings"]
+        or report["repo_config_findings"]
+        or report["effective_config_findings"]
+        or report["release_age_findings"]
+    )
+
+
+def read_roots_file(path: str) -> list[str]:
+    lines = Path(path).expanduser().read_text().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+
+
+def policy_stamp(root: Path) -> tuple[tuple[str, int, int, int] | None, ...]:
+    # Everything package_manager_policy reads from disk: root manifests, lockfiles and repo config.
+    stamp: list[tuple[str, int, int, int] | None] = []
+    for name in sorted(PACKAGE_MANAGER_FILES | CONFIG_FILES):
+        try:
+            stat = os.stat(root / name)
+        except OSError:
+            stamp.append(None)
+        else:
+            stamp.append((name, stat.st_mtime_ns, stat.st_size, stat.st_ino))
+    return tuple(stamp)
+
+
+@dataclass
+class ScannerRoot:
+    cache: ScanCache | None
+    context: ScanContext | None = None
+    stamp: tuple[Any, ...] = ()
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+@dataclass
+class Scanner:
+    """In-process scanner that keeps warm state between calls.
+
+    Build it once from IOC profiles and options, then call scan(), scan_paths() or policy() as often as
+    needed. The compiled matcher, each root's scan cache and its probed pnpm policy are reused; the policy is
+    probed again only when a root manifest, lockfile or repo config file changes. Without cache_dir the
+    per-file cache lives in memory only; use_cache=False re-analyzes every file on every call.
+
+    Reports are plain dicts and lists that json.dumps accepts. With stream_findings=True, as the CLI does,
+    finding sections are instead Findings views that spill to disk past findings_budget: iterate them, take
+    len(), or write the report with iter_json() / print_json().
+    """
+
+    ioc_profiles: list[dict[str, Any]] = field(default_factory=list)
+    matcher: IocMatcher | None = None
+    since: datetime | None = None
+    include_installed: bool = False
+    cache_dir: Path | None = None
+    use_cache: bool = True
+    release_age: ReleaseAgeCheck | None = None
+    findings_budget: int = FINDINGS_MEMORY_BUDGET
+    verify_integrity: bool = False
+    probe_budget: float = PROBE_BUDGET_SECONDS
+    instrument_top: int | None = None
+    stream_findings: bool = False
+    # Checkouts on one machine link the same pnpm store files, so parses are shared across roots.
+    shared: SharedFiles = field(default_factory=SharedFiles)
+    roots: dict[Path, ScannerRoot] = field(default_factory=dict, repr=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    digest: str = field(default="", init=False)
+
+    def __post_init__(self) -> None:
+        self.matcher = self.matcher or compile_ioc_profiles(self.ioc_profiles)
+        self.digest = profile_digest(self.ioc_profiles)
+
+    @classmethod
+    def from_ioc(cls, paths: list[str], **options: Any) -> Scanner:
+        """Load IOC profile JSON files or compiled indexes, as --ioc does."""
+        profiles, matcher = load_ioc_inputs(paths)
+        return cls(profiles, matcher, **options)
+
+    def scan(
+        self,
+        root: str | Path,
+        changed_since: str | None = None,
+        emit: Callable[[str, Any], None] | None = None,
+        fail_fast: threading.Event | None = None,
+    ) -> dict[str, Any]:
+        """Scan a whole root, or only files changed since a git ref."""
+        return self.run_scan(Path(root), changed_since=changed_since, emit=emit, fail_fast=fail_fast)
+
+    def scan_paths(
+        self,
+        root: str | Path,
+        paths: Iterable[str | Path],
+        emit: Callable[[str, Any], None] | None = None,
+        fail_fast: threading.Event | None = None,
+    ) -> dict[str, Any]:
+        """Scan only the given files (relative to root, or absolute), such as those staged for a commit."""
+        return self.run_scan(Path(root), paths=[str(path) for path in paths], emit=emit, fail_fast=fail_fast)
+
+    def policy(self, root: str | Path) -> dict[str, Any]:
+        """Return the package-manager policy of a root, probing pnpm only when its inputs changed."""
+        root = Path(root).expanduser().resolve()
+        state = self.state(root)
+        with state.lock:
+            return self.context(root, state).policy
+
+    def close(self) -> None:
+        """Stop the worker processes kept for installed package parsing."""
+        self.shared.close()
+
+    def __enter__(self) -> Scanner:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def forget_policy(self, root: str | Path) -> None:
+        self.state(Path(root).expanduser().resolve()).context = None
+
+    def state(self, root: Path) -> ScannerRoot:
+        with self.lock:
+            state = self.roots.get(root)
+            if state is None:
+                cache = None
+                if self.use_cache:
+                    cache = ScanCache.load(self.cache_dir, root, self.digest) if self.cache_dir else None
+                    cache = cache or ScanCache(None, self.digest, {})
+                state = self.roots[root] = ScannerRoot(cache)
+            return state
+
+    def context(self, root: Path, state: ScannerRoot) -> ScanContext:
+        stamp = policy_stamp(root)
+        if state.context is None or state.stamp != stamp:
+            state.context = ScanContext(root, probe_budget=self.probe_budget)
+            state.stamp = stamp
+        return state.context
+
+    def run_scan(
+        self,
+        root: Path,
+        *,
+        changed_since: str | None = None,
+        paths: list[str] | None = None,
+        emit: Callable[[str, Any], None] | None = None,
+        fail_fast: threading.Event | None = None,
+    ) -> dict[str, Any]:
+        root = root.expanduser().resolve()
+        state = self.state(root)
+        # Scans of one root share its cache and context, so they take turns; other roots run in parallel.
+        with state.lock:
+            if state.cache:
+                state.cache.hits = state.cache.misses = 0
+            return scan(
+                root,
+                since=self.since,
+                ioc_profiles=self.ioc_profiles,
+                include_installed=self.include_installed,
+                cache=state.cache,
+                matcher=self.matcher,
+                changed_since=changed_since,
+                emit=emit,
+                fail_fast=fail_fast,
+                instrumentation=Instrumentation(self.instrument_top) if self.instrument_top is not None else None,
+                context=self.context(root, state),
+                release_age=self.release_age,
+                findings_budget=self.findings_budget,
+                shared=self.shared,
+                verify_integrity=self.verify_integrity,
+                paths=paths,
+                stream_findings=self.stream_findings,
+            )
+
+    def scan_fleet(
+        self,
+        roots: list[Path],
+        jobs: int,
+        changed_since: str | None = None,
+        emitter: Callable[[Path], Callable[[str, Any], None]] | None = None,
+        fail_fast: threading.Event | None = None,
+    ) -> dict[str, Any]:
+        """Scan several roots concurrently; per-root errors are reported instead of raised."""
+
+        def scan_root(root: Path) -> dict[str, Any]:
+            if not root.exists():
+                return {"root": str(root), "error": "root does not exist"}
+            if fail_fast is not None and fail_fast.is_set():
+                return {"root": str(root), "error": "skipped after fail-fast IOC hit"}
+            emit = emitter(root) if emitter else None
+            try:
+                report = self.scan(root, changed_since, emit, fail_fast)
+            except Exception as error:  # one broken checkout must not abort the fleet
+                return {"root": str(root), "error": f"{type(error).__name__}: {error}"}
+            if emit:
+                emit("summary", report_summary(report))
+            return report
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            results = list(pool.map(scan_root, roots))
+        reports = [result for result in results if "error" not in result]
+        totals: dict[str, int] = {
+            "roots": len(roots),
+            "roots_scanned": len(reports),
+            "roots_with_ioc_hits": sum(1 for report in reports if report["ioc_hits"]),
+            "roots_with_integrity_mismatches": sum(1 for report in reports if report["integrity_mismatches"]),
+            "roots_with_hardening_gaps": sum(1 for report in reports if has_hardening_gap(report)),
+            "subprocess_count": sum(report["subprocess_count"] for report in reports),
+        }
+        for key in REPORT_FINDING_KEYS:
+            totals[key] = sum(len(report[key]) for report in reports)
+        return {
+            "ioc_profiles": [p.get("name", p.get("_path")) for p in self.ioc_profiles],
+            "reports": reports,
+            "errors": [result for result in results if "error" in result],
+            "totals": totals,
+        }
+
+
+def print_fleet_report(fleet: dict[str, Any]) -> None:
+    for report in fleet["reports"]:
+        print_report(report)
+        print()
+    for error in fleet["errors"]:
+        print(f"error: {error['root']}: {error['error']}")
+    print(f"fleet totals: {json.dumps(fleet['totals'], sort_keys=True)}")
+
+
 def print_report(report: dict[str, Any]) -> None:
     print(f"root: {report['root']}")
     print(f"package-manager policy: {json.dumps(report['package_manager_policy'], sort_keys=True)}")
     print(f"package-manager files scanned: {report['package_manager_files_scanned']}")
     print(f"ioc profiles: {json.dumps(report['ioc_profiles'], sort_keys=True)}")
-    for key in (
-        "ioc_hits",
-        "risky_direct_specs",
-        "package_lifecycle_scripts",
-        "installed_lifecycle_scripts",
-        "ci_install_findings",
-        "recent_package_manager_files",
-        "repo_config_findings",
-        "effective_config_findings",
-    ):
+    print(f"subprocesses spawned: {report['subprocess_count']}")
+    if report["aborted"]:
+        print("scan stopped early: --fail-fast IOC hit")
+    if report["cache"]:
+        print(f"scan cache: {report['cache']['hits']} hits, {report['cache']['misses']} misses")
+    if report["integrity"]:
+        integrity = report["integrity"]
+        print(
+            f"integrity: {integrity['verified']} packages verified, {integrity['cached']} unchanged, "
+            f"{integrity['unverified']} without store or cache data"
+        )
+    if report["instrumentation"]:
+        instrumentation = report["instrumentation"]
+        for name, totals in instrumentation["phases"].items():
+            print(f"phase {name}: {totals['wall_seconds']:.3f}s wall, {totals['cpu_seconds']:.3f}s cpu")
+        print(f"counters: {json.dumps(instrumentation['counters'], sort_keys=True)}")
+        for slow in instrumentation["slowest_files"]:
+            print(f"slow file: {slow['file']} {slow['seconds']:.3f}s")
+    for key in REPORT_FINDING_KEYS:
         values = report[key]
         print(f"\n## {key} ({len(values)})")
-        for value in values[:200]:
+        for value in islice(values, 200):
             if isinstance(value, dict):
                 print(json.dumps(value, sort_keys=True))
             else:
@@ -564,44 +3475,396 @@ def print_report(report: dict[str, Any]) -> None:
             print(f"... {len(values) - 200} more")
 
 
-def main() -> int:
-    parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument("--root", default=".", help="Repo/workspace root to scan")
+IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x2, 0x8, 0x40, 0x80, 0x100, 0x200
+IN_Q_OVERFLOW, IN_IGNORED, IN_ISDIR = 0x4000, 0x8000, 0x40000000
+WATCH_ADDED = IN_MOVED_TO | IN_CREATE
+WATCH_TREE_EVENTS = WATCH_ADDED | IN_MOVED_FROM | IN_DELETE
+WATCH_EVENTS = WATCH_TREE_EVENTS | IN_MODIFY | IN_CLOSE_WRITE
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def is_watched_file(name: str) -> bool:
+    return name in PACKAGE_MANAGER_FILES or name in CONFIG_FILES or os.path.splitext(name)[1] in CI_FILES
+
+
+def watch_snapshot(root: Path) -> dict[str, tuple[int, ...]]:
+    # Directory mtimes catch added, removed and renamed files (payload names matter
+    # anywhere); file stats are only kept for content the scanner actually reads.
+    snapshot: dict[str, tuple[int, ...]] = {}
+    pending = [(str(root), "")]
+    while pending:
+        path, relative = pending.pop()
+        try:
+            snapshot[relative or "."] = (os.stat(path).st_mtime_ns,)
+        except OSError:
+            continue
+        files, subdirs = list_dir(path, relative, False)
+        for entry in files:
+            if is_watched_file(entry.name):
+                try:
+                    snapshot[entry.relative] = tuple(stat_key(entry.stat()))
+                except OSError:
+                    pass
+        pending.extend(subdirs)
+    return snapshot
+
+
+def poll_changes(root: Path, interval: float) -> Iterator[set[str] | None]:
+    previous = watch_snapshot(root)
+    while True:
+        time.sleep(interval)
+        current = watch_snapshot(root)
+        changed = {key for key in previous.keys() | current.keys() if previous.get(key) != current.get(key)}
+        previous = current
+        if changed:
+            yield changed
+
+
+def inotify_changes(root: Path, debounce: float) -> Iterator[set[str] | None] | None:
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError, TypeError):
+        return None
+    if fd < 0:
+        return None
+    watches: dict[int, str] = {}
+
+    def add_tree(path: str, relative: str) -> bool:
+        pending = [(path, relative)]
+        while pending:
+            path, relative = pending.pop()
+            wd = libc.inotify_add_watch(fd, os.fsencode(path), WATCH_EVENTS)
+            if wd < 0:
+                return False
+            watches[wd] = relative
+            pending.extend(list_dir(path, relative, False)[1])
+        return True
+
+    # Running out of inotify watches (ENOSPC) on a huge tree falls back to polling.
+    if not add_tree(str(root), ""):
+        os.close(fd)
+        return None
+    return inotify_batches(fd, watches, add_tree, root, debounce)
+
+
+def inotify_batches(
+    fd: int, watches: dict[int, str], add_tree: Callable[[str, str], bool], root: Path, debounce: float
+) -> Iterator[set[str] | None]:
+    # Yields changed relative paths per burst, or None when events were lost.
+    try:
+        while True:
+            select.select([fd], [], [])
+            time.sleep(debounce)
+            changed: set[str] = set()
+            overflow = False
+            while True:
+                try:
+                    data = os.read(fd, 1 << 16)
+                except BlockingIOError:
+                    break
+                offset = 0
+                while offset < len(data):
+                    wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                    raw = data[offset + INOTIFY_EVENT.size : offset + INOTIFY_EVENT.size + length]
+                    offset += INOTIFY_EVENT.size + length
+                    name = os.fsdecode(raw.split(b"\0", 1)[0])
+                    if mask & IN_Q_OVERFLOW:
+                        overflow = True
+                        continue
+                    if mask & IN_IGNORED:
+                        watches.pop(wd, None)
+                        continue
+                    directory = watches.get(wd)
+                    if directory is None or not name:
+                        continue
+                    relative = os.path.join(directory, name) if directory else name
+                    if mask & IN_ISDIR:
+                        if should_skip_dir(name, False):
+                            continue
+                        if mask & WATCH_ADDED and not add_tree(os.path.join(root, relative), relative):
+                            overflow = True
+                        changed.add(relative)
+                    elif mask & WATCH_TREE_EVENTS or is_watched_file(name):
+                        changed.add(relative)
+            if overflow:
+                yield None
+            elif changed:
+                yield changed
+    finally:
+        os.close(fd)
+
+
+def policy_inputs_changed(changed: set[str] | None) -> bool:
+    # The policy reads root-level manifests/lockfiles and repo config files; "." is the
+    # polled root directory, whose listing change may be a lockfile appearing.
+    if changed is None:
+        return True
+    return any(
+        path == "."
+        or os.path.basename(path) in CONFIG_FILES
+        or (os.sep not in path and path in PACKAGE_MANAGER_FILES)
+        for path in changed
+    )
+
+
+@dataclass
+class ScanWatch:
+    root: Path
+    scanner: Scanner
+    report: dict[str, Any] | None = None
+    scans: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def rescan(self, changed: set[str] | None = None) -> dict[str, Any]:
+        if policy_inputs_changed(changed):
+            self.scanner.forget_policy(self.root)
+        report = self.scanner.scan(self.root)
+        report["scanned_at"] = datetime.now(timezone.utc).isoformat()
+        with self.lock:
+            self.report = report
+            self.scans += 1
+        return report
+
+    def respond(self, command: str) -> Any:
+        with self.lock:
+            report = self.report
+            scans = self.scans
+        if command == "report":
+            return report
+        if command == "summary":
+            return {**report_summary(report), "scans": scans} if report else None
+        return {"error": f"unknown command: {command}; expected report or summary"}
+
+
+def serve_watch(path: Path, watch: ScanWatch) -> socketserver.ThreadingUnixStreamServer:
+    class Handler(socketserver.StreamRequestHandler):
+        wbufsize = 64 * 1024
+
+        def handle(self) -> None:
+            command = self.rfile.readline().decode(errors="ignore").strip() or "report"
+            for chunk in iter_json(watch.respond(command), indent=None):
+                self.wfile.write(chunk.encode())
+            self.wfile.write(b"\n")
+
+    if path.exists():
+        try:
+            query_watch(path, "summary")
+        except OSError:
+            path.unlink()  # stale socket from a daemon that did not exit cleanly
+        else:
+            raise ValueError(f"another --watch daemon is serving {path}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    server = socketserver.ThreadingUnixStreamServer(str(path), Handler)
+    server.daemon_threads = True
+    os.chmod(path, 0o600)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def query_watch(path: Path, command: str) -> Any:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(10)
+        client.connect(str(path))
+        client.sendall(command.encode() + b"\n")
+        with client.makefile("rb") as response:
+            return json.loads(response.readline() or b"null")
+
+
+def watch_main(watch: ScanWatch, socket_path: Path, interval: float, as_json: bool) -> int:
+    def log(report: dict[str, Any], reason: str, changed: set[str]) -> None:
+        summary = report_summary(report)
+        if as_json:
+            print(json.dumps({"type": "scan", "reason": reason, "changed": sorted(changed), **summary}, sort_keys=True))
+        else:
+            print(
+                f"{report['scanned_at']} {reason}: {summary['counts']['ioc_hits']} ioc hits, "
+                f"{report['cache']['misses']} files re-analyzed, {report['subprocess_count']} subprocesses"
+            )
+        sys.stdout.flush()
+
+    try:
+        server = serve_watch(socket_path, watch)
+    except (OSError, ValueError) as error:
+        print(f"cannot serve {socket_path}: {error}", file=sys.stderr)
+        return 2
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        # Watches are in place before the initial scan so edits made during it are not lost.
+        changes = inotify_changes(watch.root, min(interval, 0.25))
+        mode = "inotify" if changes is not None else f"stat polling every {interval}s"
+        print(f"watching {watch.root} ({mode}); serving reports on {socket_path}", file=sys.stderr, flush=True)
+        log(watch.rescan(), "initial scan", set())
+        for changed in changes or poll_changes(watch.root, interval):
+            if changed is None:
+                log(watch.rescan(), "watch events lost, full rescan", set())
+            else:
+                log(watch.rescan(changed), f"{len(changed)} changed paths", changed)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        socket_path.unlink(missing_ok=True)
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["compile-ioc"]:
+        return compile_ioc_main(argv[1:])
+    if argv[:1] == ["import-publish-times"]:
+        return import_publish_times_main(argv[1:])
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        epilog="Run `compile-ioc PROFILE.json...` to precompile IOC profiles into an index, and "
+        "`import-publish-times DB EXPORT...` to build the --publish-db store.",
+    )
+    parser.add_argument("--root", action="append", default=[], help="Repo/workspace root to scan (repeatable)")
+    parser.add_argument("--roots-from", help="File listing one root per line to scan as a fleet")
+    parser.add_argument("--jobs", type=int, default=4, help="Roots scanned concurrently in fleet mode")
     parser.add_argument("--since", help="UTC cutoff for recent package-manager file mtimes")
-    parser.add_argument("--ioc", action="append", default=[], help="Incident IOC JSON profile to apply")
+    parser.add_argument("--ioc", action="append", default=[], help="IOC profile JSON or compiled index to apply")
     parser.add_argument("--include-installed", action="store_true", help="Scan installed node_modules package metadata")
     parser.add_argument("--json", action="store_true", help="Emit JSON report")
+    parser.add_argument("--ndjson", action="store_true", help="Stream each finding as a JSON line, then a summary line")
+    parser.add_argument("--fail-fast", action="store_true", help="Stop scanning and exit 1 on the first IOC hit")
     parser.add_argument("--strict", action="store_true", help="Exit 1 on IOC hits or hardening gaps")
-    args = parser.parse_args()
-
-    root = Path(args.root).expanduser().resolve()
-    if not root.exists():
-        print(f"root does not exist: {root}", file=sys.stderr)
+    parser.add_argument("--changed-since", help="Only analyze files changed since this git ref (plus untracked files)")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="Directory for the per-file scan cache")
+    parser.add_argument("--no-cache", action="store_true", help="Re-analyze every file and leave the cache untouched")
+    parser.add_argument("--instrument", action="store_true", help="Report per-phase timings and I/O counters")
+    parser.add_argument("--instrument-top", type=int, default=10, help="Slowest files listed with --instrument")
+    parser.add_argument("--watch", action="store_true", help="Keep running, rescan on changes, serve the report")
+    parser.add_argument("--watch-interval", type=float, default=2.0, help="Polling interval without inotify (seconds)")
+    parser.add_argument("--socket", help="Unix socket for --watch/--query (default: next to the scan cache)")
+    parser.add_argument("--query", action="store_true", help="Print the report held by a running --watch daemon")
+    parser.add_argument("--publish-db", help="Publish-time store; flags lockfile versions younger than the minimum age")
+    parser.add_argument(
+        "--min-release-age-days",
+        type=float,
+        default=DEFAULT_RELEASE_AGE_DAYS,
+        help="Minimum age for --publish-db checks, against the lockfile change and IOC incident_window_start",
+    )
+    parser.add_argument(
+        "--findings-memory-mb",
+        type=float,
+        default=FINDINGS_MEMORY_BUDGET / 1024 / 1024,
+        help="Findings held in memory before the report spills them to a temporary file",
+    )
+    parser.add_argument(
+        "--hash-installed",
+        action="store_true",
+        help="With --include-installed, also parse byte-identical package.json files once, not only hardlinks",
+    )
+    parser.add_argument(
+        "--verify-integrity",
+        action="store_true",
+        help="Compare installed pnpm/npm packages with the files behind their lockfile integrity hashes",
+    )
+    parser.add_argument(
+        "--probe-budget",
+        type=float,
+        default=PROBE_BUDGET_SECONDS,
+        help="Seconds for all concurrent pnpm policy probes of a root; late probes are reported as unknown",
+    )
+    args = parser.parse_args(argv)
+    release_age = None
+    if args.publish_db:
+        publish_db = Path(args.publish_db).expanduser().resolve()
+        if not publish_db.is_file():
+            print(f"publish-time store does not exist: {publish_db}", file=sys.stderr)
+            return 2
+        release_age = ReleaseAgeCheck(publish_db, args.min_release_age_days)
+
+    raw_roots = list(args.root)
+    if args.roots_from:
+        try:
+            raw_roots.extend(read_roots_file(args.roots_from))
+        except OSError as error:
+            print(f"cannot read roots file: {error}", file=sys.stderr)
+            return 2
+    roots = [Path(raw).expanduser().resolve() for raw in raw_roots or ["."]]
+    if len(roots) == 1 and not args.roots_from and not roots[0].exists():
+        print(f"root does not exist: {roots[0]}", file=sys.stderr)
         return 2
+    if (args.watch or args.query) and (len(roots) > 1 or args.roots_from):
+        print("--watch and --query take a single --root", file=sys.stderr)
+        return 2
+    socket_path = Path(args.socket or Path(args.cache_dir) / f"{root_key(roots[0])}.sock").expanduser()
+    if args.query:
+        try:
+            report = query_watch(socket_path, "report")
+        except (OSError, ValueError) as error:
+            print(f"no --watch daemon answering on {socket_path}: {error}", file=sys.stderr)
+            return 2
+        if not isinstance(report, dict):
+            print(f"--watch daemon on {socket_path} has no report yet (initial scan running)", file=sys.stderr)
+            return 2
+        if args.json:
+            print_json(report)
+        else:
+            print_report(report)
+        return 1 if has_tampering(report) else 0
     try:
-        profiles = load_ioc_profiles(args.ioc)
+        scanner = Scanner.from_ioc(
+            args.ioc,
+            since=parse_since(args.since),
+            include_installed=args.include_installed,
+            cache_dir=None if args.no_cache else Path(args.cache_dir).expanduser(),
+            # A --watch daemon always keeps results in memory; --no-cache only skips the disk.
+            use_cache=args.watch or not args.no_cache,
+            release_age=release_age,
+            findings_budget=int(args.findings_memory_mb * 1024 * 1024),
+            verify_integrity=args.verify_integrity,
+            probe_budget=args.probe_budget,
+            instrument_top=args.instrument_top if args.instrument else None,
+            shared=SharedFiles(hash_content=args.hash_installed),
+            stream_findings=True,
+        )
     except ValueError as error:
         print(str(error), file=sys.stderr)
         return 2
 
-    report = scan(root, parse_since(args.since), profiles, args.include_installed)
-    if args.json:
-        print(json.dumps(report, indent=2, sort_keys=True))
-    else:
-        print_report(report)
+    with scanner:
+        if args.watch:
+            return watch_main(ScanWatch(roots[0], scanner), socket_path, args.watch_interval, args.json)
+
+        emitter = ndjson_emitter(threading.Lock()) if args.ndjson else None
+        fail_fast = threading.Event() if args.fail_fast else None
+        if len(roots) > 1 or args.roots_from:
+            fleet = scanner.scan_fleet(roots, args.jobs, args.changed_since, emitter, fail_fast)
+            if emitter:
+                print(json.dumps({"type": "fleet-summary", "totals": fleet["totals"], "errors": fleet["errors"]}))
+            elif args.json:
+                print_json(fleet)
+            else:
+                print_fleet_report(fleet)
+            if any(fleet["totals"][key] for key in FAIL_FAST_SECTIONS):
+                return 1
+            if args.strict and fleet["totals"]["roots_with_hardening_gaps"]:
+                return 1
+            return 2 if fleet["errors"] else 0
+
+        root = roots[0]
+        emit = emitter(root) if emitter else None
+        try:
+            report = scanner.scan(root, args.changed_since, emit, fail_fast)
+        except ValueError as error:
+            print(str(error), file=sys.stderr)
+            return 2
+        if emit:
+            emit("summary", report_summary(report))
+        elif args.json:
+            print_json(report)
+        else:
+            print_report(report)
 
-    hardening_gap = bool(
-        report["risky_direct_specs"]
-        or report["package_lifecycle_scripts"]
-        or report["ci_install_findings"]
-        or report["repo_config_findings"]
-        or report["effective_config_findings"]
-    )
-    if report["ioc_hits"]:
-        return 1
-    if args.strict and hardening_gap:
-        return 1
-    return 0
+        if has_tampering(report):
+            return 1
+        if args.strict and has_hardening_gap(report):
+            return 1
+        return 0
 
 
 if __name__ == "__main__":
@@ -0,0 +1,37 @@
+"""Fixture helpers shared by bench_js_supply_chain.py and selfcheck_js_supply_chain.py."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+# Answers like pnpm 11: `config get` prints strings bare and other values as JSON, or `undefined` when unset.
+# STUB_PNPM_NO_LIST makes `config list` fail, so callers fall back to one `config get` per key.
+STUB_PNPM = """#!/usr/bin/env python3
+import json, os, sys
+CONFIG = {config}
+args = sys.argv[1:]
+if args == ["--version"]:
+    print("11.1.1")
+elif args[:2] == ["config", "list"] and not os.environ.get("STUB_PNPM_NO_LIST"):
+    print(json.dumps(CONFIG))
+elif args[:2] == ["config", "get"] and len(args) > 2:
+    value = CONFIG.get(args[2])
+    print("undefined" if value is None else value if isinstance(value, str) else json.dumps(value))
+else:
+    sys.exit(1)
+"""
+
+
+def write_json(path: Path, data: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, indent=2) + "\n")
+
+
+def write_stub_pnpm(bin_dir: Path, config: dict[str, Any]) -> Path:
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    stub = bin_dir / "pnpm"
+    stub.write_text(STUB_PNPM.format(config=repr(config)))
+    stub.chmod(0o755)
+    return stub
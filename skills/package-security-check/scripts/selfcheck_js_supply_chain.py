@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Offline self-checks for check_js_supply_chain.py, run against small generated fixtures and a stub pnpm."""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import check_js_supply_chain as scanner  # noqa: E402
+from fixtures_js_supply_chain import write_json, write_stub_pnpm  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent.parent / "data" / "fixtures"
+
+STUB_PNPM_CONFIG = {
+    "minimumReleaseAge": 10080,
+    "minimum-release-age-strict": True,
+    "minimumReleaseAgeIgnoreMissingTime": False,
+    "block-exotic-subdeps": True,
+    "trustPolicy": "no-downgrade",
+    "trustPolicyIgnoreAfter": 43200,
+    "dangerouslyAllowAllBuilds": False,
+}
+
+CHECKS: dict[str, Callable[[Path], None]] = {}
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def check(function: Callable[[Path], None]) -> Callable[[Path], None]:
+    CHECKS[function.__name__] = function
+    return function
+
+
+def expect(condition: bool, message: str) -> None:
+    if not condition:
+        raise CheckFailed(message)
+
+
+def install_stub_pnpm(base: Path) -> None:
+    bin_dir = base / "bin"
+    write_stub_pnpm(bin_dir, STUB_PNPM_CONFIG)
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+
+
+def pnpm_repo(base: Path) -> Path:
+    root = base / "repo"
+    manifest = {"name": "repo", "packageManager": "pnpm@11.1.1", "dependencies": {"a": "latest"}}
+    write_json(root / "package.json", manifest)
+    (root / "pnpm-lock.yaml").write_text("lockfileVersion: '9.0'\n\npackages:\n\n  a@1.0.0:\n    resolution: {}\n")
+    return root
+
+
+@check
+def scanner_reports_are_plain_json(base: Path) -> None:
+    install_stub_pnpm(base)
+    root = pnpm_repo(base)
+    api = scanner.Scanner()
+    reports = [api.scan(root), api.scan(root), api.scan_paths(root, ["package.json"])]
+    for report in reports:
+        decoded = json.loads(json.dumps(report))
+        for key in scanner.REPORT_FINDING_KEYS:
+            expect(isinstance(report[key], list), f"{key} is {type(report[key]).__name__}, not a list")
+            expect(decoded[key] == report[key], f"{key} does not survive json.dumps")
+        expect(report["risky_direct_specs"][0]["package"] == "a", "risky spec not reported")
+    expect(reports[1]["subprocess_count"] == 0, "warm scan probed pnpm again")
+    expect(reports[1]["cache"]["misses"] == 0, "warm scan re-analyzed files")
+    expect(json.loads(json.dumps(api.policy(root)))["manager"] == "pnpm", "policy() is not plain JSON")
+
+
+@check
+def pnpm_bulk_and_per_key_config_agree(base: Path) -> None:
+    install_stub_pnpm(base)
+    root = pnpm_repo(base)
+    effective: dict[str, dict[str, str | None]] = {}
+    probes: dict[str, int] = {}
+    for mode in ("bulk", "per-key"):
+        # The stub fails `pnpm config list --json` in per-key mode, forcing one `pnpm config get` per setting.
+        if mode == "per-key":
+            os.environ["STUB_PNPM_NO_LIST"] = "1"
+        try:
+            context = scanner.ScanContext(root)
+            effective[mode] = context.policy["effective_pnpm_config"]
+            probes[mode] = context.subprocess_count
+        finally:
+            os.environ.pop("STUB_PNPM_NO_LIST", None)
+        expect(effective[mode]["minimumReleaseAge"] == "10080", f"{mode}: minimumReleaseAge not read")
+        expect(effective[mode]["blockExoticSubdeps"] == "true", f"{mode}: kebab-case alias not read")
+        expect(effective[mode]["savePrefix"] is None, f"{mode}: unset savePrefix reported as set")
+    expect(probes["bulk"] < probes["per-key"], f"per-key mode was not exercised: {probes}")
+    expect(effective["bulk"] == effective["per-key"], f"bulk {effective['bulk']} != per-key {effective['per-key']}")
+
+
+@check
+def release_age_from_offline_metadata(base: Path) -> None:
+    install_stub_pnpm(base)
+    db = base / "publish #1 ?%20times.db"  # characters a raw file: URI would misread
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        status = scanner.main(["import-publish-times", str(db), str(FIXTURES / "registry-metadata.ndjson")])
+    expect(status == 0, f"import-publish-times exited {status}")
+    expect("5 package versions" in output.getvalue(), f"unexpected import result: {output.getvalue().strip()}")
+    root = base / "repo"
+    write_json(root / "package.json", {"name": "repo"})
+    lockfile = root / "pnpm-lock.yaml"
+    lockfile.write_text(
+        "lockfileVersion: '9.0'\n\npackages:\n\n"
+        "  settled-lib@1.0.0:\n    resolution: {}\n\n"
+        "  '@fixture/fresh@2.0.0':\n    resolution: {}\n\n"
+        "  late-lib@3.0.0:\n    resolution: {}\n\n"
+        "  after-incident-lib@4.0.0:\n    resolution: {}\n\n"
+        "  unknown-lib@1.0.0:\n    resolution: {}\n"
+    )
+    # Not a git checkout, so the lockfile's mtime is its change time.
+    changed = datetime(2026, 5, 12, tzinfo=timezone.utc).timestamp()
+    os.utime(lockfile, (changed, changed))
+    profile = {"name": "fixture-incident", "incident_window_start": "2026-05-11T00:00:00Z"}
+    api = scanner.Scanner([profile], release_age=scanner.ReleaseAgeCheck(db, 7), use_cache=False)
+    found = {(item["package"], item["reason"]) for item in api.scan(root)["release_age_findings"]}
+    wanted = {
+        ("@fixture/fresh@2.0.0", "published 2.0 days before the lockfile change (minimum 7)"),
+        ("@fixture/fresh@2.0.0", "published 1.0 days before the fixture-incident incident window start"),
+        ("late-lib@3.0.0", "published 1.0 days after the lockfile change"),
+        ("late-lib@3.0.0", "published 2.0 days after the fixture-incident incident window start"),
+        # Three weeks after the incident start, outside the 7-day margin around it.
+        ("after-incident-lib@4.0.0", "published 20.0 days after the lockfile change"),
+    }
+    expect(found == wanted, f"unexpected release age findings: {sorted(found ^ wanted)}")
+
+
+def sri(data: bytes) -> str:
+    return "sha512-" + base64.b64encode(hashlib.sha512(data).digest()).decode()
+
+
+@check
+def integrity_covers_names_with_underscores(base: Path) -> None:
+    install_stub_pnpm(base)
+    root = base / "repo"
+    store = base / "store" / "v3"
+    write_json(root / "package.json", {"name": "repo"})
+    (root / "node_modules").mkdir(parents=True)
+    (root / "node_modules" / ".modules.yaml").write_text(f"storeDir: {store}\n")
+    lock = ["lockfileVersion: '9.0'\n\npackages:\n"]
+    for name, version, directory in (
+        ("string_decoder", "1.3.0", "string_decoder@1.3.0"),
+        ("@types/node_fetch", "2.6.0", "@types+node_fetch@2.6.0"),
+        ("left-pad", "1.3.0", "left-pad@1.3.0(react@18.2.0)"),
+    ):
+        files = {
+            "index.js": f"module.exports = '{name}'\n".encode(),
+            "package.json": json.dumps({"name": name}).encode(),
+        }
+        tarball = sri(f"{name}@{version}".encode())
+        lock.append(f"\n  '{name}@{version}':\n    resolution: {{integrity: {tarball}}}\n")
+        index = {"files": {relative: {"integrity": sri(data), "size": len(data)} for relative, data in files.items()}}
+        digest = hashlib.sha512(f"{name}@{version}".encode()).hexdigest()
+        write_json(store / "files" / digest[:2] / f"{digest[2:]}-index.json", index)
+        package = root / "node_modules" / ".pnpm" / directory / "node_modules" / name
+        for relative, data in files.items():
+            (package / relative).parent.mkdir(parents=True, exist_ok=True)
+            (package / relative).write_bytes(data)
+    (root / "pnpm-lock.yaml").write_text("".join(lock))
+    virtual_store = root / "node_modules" / ".pnpm"
+    (virtual_store / "string_decoder@1.3.0" / "node_modules" / "string_decoder" / "index.js").write_text("")
+    # pnpm hashes over-long entry names; with no name and version to look up, this one cannot be verified.
+    (virtual_store / "0123456789abcdef" / "node_modules").mkdir(parents=True)
+    report = scanner.Scanner(verify_integrity=True, use_cache=False).scan(root)
+    mismatches = {(item["package"], Path(item["path"]).name) for item in report["integrity_mismatches"]}
+    expect(mismatches == {("string_decoder@1.3.0", "index.js")}, f"unexpected integrity mismatches: {mismatches}")
+    expect(report["integrity"] == {"verified": 3, "cached": 0, "unverified": 1}, f"counts: {report['integrity']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("checks", nargs="*", help=f"Checks to run (default: all): {', '.join(CHECKS)}")
+    args = parser.parse_args()
+    unknown = [name for name in args.checks if name not in CHECKS]
+    if unknown:
+        parser.error(f"unknown checks: {', '.join(unknown)}")
+    path = os.environ.get("PATH", "")
+    failed = 0
+    for name in args.checks or list(CHECKS):
+        base = Path(tempfile.mkdtemp(prefix="pscself-"))
+        try:
+            CHECKS[name](base)
+        except CheckFailed as error:
+            failed += 1
+            print(f"FAIL {name}: {error}")
+        else:
+            print(f"ok   {name}")
+        finally:
+            os.environ["PATH"] = path
+            shutil.rmtree(base, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())